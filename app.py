@@ -1,11 +1,28 @@
 import os
 import io
+import re
 import json
+import time
+import itertools
+import unicodedata
+from collections import Counter, OrderedDict, deque
+import uuid
+import queue
+import logging
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing, contextmanager
+import httplib2
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
 import streamlit as st
 from google.oauth2 import service_account
+from google_auth_httplib2 import AuthorizedHttp
 from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseDownload, MediaIoBaseUpload
+from googleapiclient.http import HttpRequest, MediaIoBaseDownload, MediaIoBaseUpload
 
 # Configuração da página DEVE SER A PRIMEIRA CHAMADA
 st.set_page_config(
@@ -36,6 +53,7 @@ def verificar_usuario_senha():
     # Verifica se o usuário e a senha estão corretos
     if usuario in USUARIOS_VALIDOS and senha == USUARIOS_VALIDOS[usuario]:
         st.session_state.usuario_autenticado = True  # Marca o usuário como autenticado
+        st.session_state.usuario = usuario
         st.rerun()  # Recarrega o aplicativo para remover as barras de usuário e senha
     elif usuario != "" or senha != "":
         # Centraliza a mensagem de erro
@@ -46,72 +64,1854 @@ def verificar_usuario_senha():
 SCOPES = ["https://www.googleapis.com/auth/drive"]
 FOLDER_ID = "1abI_PNRR0N5dgKJ7EXCsAFf_LdN6mLwA"  # ID da pasta "dados_refs" no Google Drive
 FILE_NAME = "refs.csv"  # Nome do arquivo CSV
+SNAPSHOT_NAME = "refs.parquet"  # Snapshot colunar da tabela, carregado no lugar do CSV quando atualizado
+COLUNAS_CATEGORICAS = ["CAMPANHA", "CATEGORIA", "LOCAL", "IDIOMA"]  # Campos com poucos valores distintos
+PREFIXO_DELTA = "refs_delta_"  # Prefixo dos arquivos com as alterações pendentes de compactação
+LIMITE_DELTAS = 50  # Quantidade de alterações acumuladas antes de reescrever o CSV completo
+BLOCOS_INCORPORADOS = 25  # Propriedades do arquivo base que listam os deltas já incorporados a ele
+CHAVES_POR_BLOCO = 8  # Chaves de delta por propriedade (o Drive limita cada propriedade a 124 bytes)
+LIMITE_INCORPORADOS = BLOCOS_INCORPORADOS * CHAVES_POR_BLOCO  # Deltas incorporados por compactação
+TAMANHO_PARTE_DOWNLOAD = int(os.getenv("REFS_TAMANHO_PARTE", 4 * 1024 * 1024))  # Bytes baixados por vez do CSV
+LINHAS_POR_PARTE = 20_000  # Linhas do CSV interpretadas (e indexadas) por vez durante o carregamento
+INTERVALO_ATUALIZACAO = int(os.getenv("REFS_INTERVALO_ATUALIZACAO", 60))  # Segundos entre verificações de mudanças no armazenamento
+THREADS_CARREGAMENTO = 2  # Threads compartilhadas que carregam a tabela e os índices em segundo plano
+COLUNA_ID = "ID"  # Identificador permanente de cada referência
+COLUNA_EXCLUIDA = "_EXCLUIDA"  # Marcação (apenas em memória) das linhas excluídas até a compactação
+JANELA_LOTE_ESCRITA = 0.2  # Segundos de espera para agrupar alterações simultâneas em uma só gravação
+TENTATIVAS_ESCRITA = 3  # Tentativas de gravação antes de desistir
+TEMPO_LIMITE_ESCRITA = 30  # Segundos que a sessão aguarda a confirmação da gravação
+COLUNAS_REFS = [  # Colunas da tabela de referências, além do ID
+    "TITULO", "CAMPANHA", "CATEGORIA", "LOCAL", "ASSUNTO_PRINCIPAL",
+    "CAMINHO", "DESCRICAO", "IDIOMA", "PALAVRAS_CHAVES",
+]
+COLUNAS_BUSCA = ["ASSUNTO_PRINCIPAL", "CAMPANHA", "PALAVRAS_CHAVES", "DESCRICAO"]  # Colunas com busca por substring
+
+# Configurações do armazenamento da tabela de referências
+ARMAZENAMENTO = os.getenv("REFS_ARMAZENAMENTO", "drive")  # "drive", "local" ou "sqlite"
+DIRETORIO_LOCAL = os.getenv("REFS_DIRETORIO", "dados_refs")  # Pasta usada pelo armazenamento "local"
+CAMINHO_SQLITE = os.getenv("REFS_SQLITE", "refs.sqlite3")  # Banco usado pelo armazenamento "sqlite"
+
+# Configurações da instrumentação de desempenho
+USUARIOS_ADMIN = {"Admin2Steps"}  # Usuários (de USUARIOS_VALIDOS) que veem a aba de desempenho
+LIMITE_MEDICOES = 500  # Medições recentes guardadas por etapa para os histogramas
+LIMITE_EXECUCOES = 200  # Execuções recentes guardadas para listar as mais lentas
+FAIXAS_HISTOGRAMA = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]  # Limites (s) do histograma exportado
+ARQUIVO_METRICAS = os.getenv("REFS_METRICAS", "metricas_refs.prom")  # Arquivo no formato do Prometheus
+INTERVALO_EXPORTACAO = 15  # Segundos mínimos entre gravações do arquivo de métricas
+
+# Configurações da busca ranqueada em todos os campos
+BUSCA_GERAL = "TODOS_OS_CAMPOS"  # Valor de coluna_busca para a busca em todos os campos
+PESOS_BM25 = {  # Peso de cada campo na pontuação final
+    "TITULO": 3.0,
+    "ASSUNTO_PRINCIPAL": 2.5,
+    "PALAVRAS_CHAVES": 2.0,
+    "CAMPANHA": 1.5,
+    "DESCRICAO": 1.0,
+}
+BM25_K1 = 1.2  # Saturação da frequência das palavras
+BM25_B = 0.75  # Normalização pelo tamanho do texto
+TOP_K_BUSCA = 50  # Quantidade máxima de resultados da busca ranqueada
+
+# Configurações da busca por referências semelhantes (TF-IDF sobre as descrições)
+BUSCA_SEMELHANTES = "REFERENCIAS_SEMELHANTES"  # Valor de coluna_busca para a busca por texto semelhante
+SEMELHANTES_A = "SEMELHANTES_A"  # Busca das referências semelhantes a uma referência (o termo é o seu ID)
+COLUNA_SEMELHANCA = "DESCRICAO"  # Campo comparado entre as referências
+TOP_K_SEMELHANTES = 30  # Quantidade máxima de referências semelhantes exibidas
+RESULTADOS_POR_PAGINA = 10  # Quantidade de resultados exibidos por página
+LIMITE_CACHE_BUSCAS = 20  # Quantidade de buscas recentes guardadas por sessão
+COLUNAS_INDEXADAS = list(dict.fromkeys(COLUNAS_BUSCA + list(PESOS_BM25)))  # Colunas com índice invertido
+FRACAO_VARREDURA = 0.1  # Acima dessa fração das linhas, a busca por trecho confere a coluna inteira numa única varredura
+
+# Erro de escrita causado por uma alteração concorrente no armazenamento
+class ConflitoEscrita(Exception):
+    pass
+
+# Métricas de desempenho compartilhadas entre sessões: medições recentes de cada etapa
+# (para os histogramas), totais acumulados (para o Prometheus) e as execuções recentes
+@st.cache_resource(show_spinner=False)
+def _metricas():
+    return {"lock": threading.Lock(), "etapas": {}, "execucoes": deque(maxlen=LIMITE_EXECUCOES), "exportado_em": 0.0}
+
+# Etapas medidas durante a execução (rerun) em andamento na thread atual
+_execucao_atual = threading.local()
+
+def _registrar_etapa(nome, duracao, medida):
+    metricas = _metricas()
+    with metricas["lock"]:
+        etapa = metricas["etapas"].get(nome)
+        if etapa is None:
+            etapa = metricas["etapas"][nome] = {
+                "duracoes": deque(maxlen=LIMITE_MEDICOES), "contagem": 0, "soma": 0.0,
+                "faixas": [0] * (len(FAIXAS_HISTOGRAMA) + 1), "linhas": 0, "bytes": 0,
+            }
+        etapa["duracoes"].append(duracao)
+        etapa["contagem"] += 1
+        etapa["soma"] += duracao
+        etapa["faixas"][int(np.searchsorted(FAIXAS_HISTOGRAMA, duracao))] += 1
+        etapa["linhas"] += medida.get("linhas") or 0
+        etapa["bytes"] += medida.get("bytes") or 0
+    etapas = getattr(_execucao_atual, "etapas", None)
+    if etapas is not None:
+        etapas.append({"etapa": nome, "duracao": duracao, **medida})
+
+# Mede a duração de uma etapa. Pode ser usado com "with" (preenchendo "linhas" e "bytes"
+# no dicionário retornado) ou como decorador: @medir_etapa("nome").
+@contextmanager
+def medir_etapa(nome):
+    medida = {"linhas": None, "bytes": None}
+    inicio = time.perf_counter()
+    try:
+        yield medida
+    finally:
+        # Também mede etapas interrompidas por exceções, inclusive o st.rerun()
+        _registrar_etapa(nome, time.perf_counter() - inicio, medida)
+
+# Mede uma execução completa do app, guardando junto as etapas medidas durante ela
+@contextmanager
+def medir_execucao():
+    _execucao_atual.etapas = []
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        duracao = time.perf_counter() - inicio
+        etapas, _execucao_atual.etapas = _execucao_atual.etapas, None
+        _registrar_etapa("execucao", duracao, {"linhas": None, "bytes": None})
+        metricas = _metricas()
+        with metricas["lock"]:
+            metricas["execucoes"].append({"horario": time.time(), "duracao": duracao, "etapas": etapas})
+            exportar = time.time() - metricas["exportado_em"] >= INTERVALO_EXPORTACAO
+            if exportar:
+                metricas["exportado_em"] = time.time()
+        if exportar:
+            try:
+                exportar_metricas()
+            except OSError:
+                logging.getLogger(__name__).exception("Erro ao exportar as métricas")
+
+# Métricas acumuladas no formato de texto do Prometheus
+def metricas_prometheus():
+    metricas = _metricas()
+    with metricas["lock"]:
+        etapas = {nome: dict(etapa, faixas=list(etapa["faixas"])) for nome, etapa in sorted(metricas["etapas"].items())}
+
+    linhas = [
+        "# HELP refs_etapa_duracao_segundos Duração das etapas do app.",
+        "# TYPE refs_etapa_duracao_segundos histogram",
+    ]
+    for nome, etapa in etapas.items():
+        for limite, acumulado in zip(FAIXAS_HISTOGRAMA + ["+Inf"], np.cumsum(etapa["faixas"])):
+            linhas.append(f'refs_etapa_duracao_segundos_bucket{{etapa="{nome}",le="{limite}"}} {acumulado}')
+        linhas.append(f'refs_etapa_duracao_segundos_sum{{etapa="{nome}"}} {etapa["soma"]:.6f}')
+        linhas.append(f'refs_etapa_duracao_segundos_count{{etapa="{nome}"}} {etapa["contagem"]}')
+    for metrica, descricao in (("linhas", "Linhas processadas"), ("bytes", "Bytes transferidos")):
+        linhas.append(f"# HELP refs_etapa_{metrica}_total {descricao} pelas etapas do app.")
+        linhas.append(f"# TYPE refs_etapa_{metrica}_total counter")
+        for nome, etapa in etapas.items():
+            linhas.append(f'refs_etapa_{metrica}_total{{etapa="{nome}"}} {etapa[metrica]}')
+    return "\n".join(linhas) + "\n"
+
+# Grava as métricas em ARQUIVO_METRICAS (lido pelo node_exporter ou outro coletor)
+def exportar_metricas():
+    temporario = f"{ARQUIVO_METRICAS}.{uuid.uuid4().hex[:8]}.tmp"
+    with open(temporario, "w", encoding="utf-8") as arquivo:
+        arquivo.write(metricas_prometheus())
+    os.replace(temporario, ARQUIVO_METRICAS)
+
+# Cria o cliente do Google Drive uma única vez por processo (compartilhado entre sessões)
+@st.cache_resource(show_spinner=False)
+def _criar_servico_drive():
+    # Carrega as credenciais da variável de ambiente
+    google_credentials_info = json.loads(os.getenv("GOOGLE_CREDENTIALS"))
+    credentials = service_account.Credentials.from_service_account_info(google_credentials_info, scopes=SCOPES)
+
+    # O httplib2 não é thread-safe: cada requisição ganha sua própria conexão autorizada,
+    # permitindo que várias sessões usem o mesmo cliente ao mesmo tempo
+    def request_builder(http, *args, **kwargs):
+        return HttpRequest(AuthorizedHttp(credentials, http=httplib2.Http()), *args, **kwargs)
+
+    return build("drive", "v3", credentials=credentials, requestBuilder=request_builder, cache_discovery=False)
 
 # Função para autenticar no Google Drive
+@medir_etapa("autenticacao")
 def authenticate_google_drive():
     try:
-        # Carrega as credenciais da variável de ambiente
-        google_credentials_info = json.loads(os.getenv("GOOGLE_CREDENTIALS"))
-        credentials = service_account.Credentials.from_service_account_info(google_credentials_info, scopes=SCOPES)
-        return build("drive", "v3", credentials=credentials)
+        return _criar_servico_drive()
     except Exception as e:
         st.error(f"Erro ao autenticar no Google Drive: {e}")
         return None
 
-# Função para baixar o CSV do Google Drive
-def download_csv(service):
-    try:
-        # Busca o arquivo CSV diretamente na pasta "dados_refs"
-        query = f"'{FOLDER_ID}' in parents and name = '{FILE_NAME}'"
-        response = service.files().list(q=query, fields="files(id)").execute()
-        files = response.get("files", [])
-
-        if files:
-            file_id = files[0]["id"]
-            request = service.files().get_media(fileId=file_id)
+# Cache de refs.csv compartilhado entre sessões, identificado pela revisão do arquivo base
+# (snapshot ou CSV) e pela lista de alterações (deltas) já aplicadas sobre ele
+@st.cache_resource(show_spinner=False)
+def _cache_refs():
+    return {
+        "lock": threading.Lock(), "ids": {}, "base": None, "revisao": None, "deltas": [], "df": None,
+        "lock_carga": threading.Lock(),  # Garante um único carregamento do armazenamento por vez
+        "urls": None, "lock_urls": threading.Lock(),  # Último índice de links (ver _indice_urls)
+        "incorporados": set(),  # Chaves dos deltas já incorporados ao arquivo base
+        "deltas_incorporados": [],  # Arquivos desses deltas que ainda não foram removidos
+        "posicoes": {},  # Índice hash: ID da referência -> posição da linha no DataFrame em cache
+        "indices": {},  # Último índice de busca construído para cada coluna, base das atualizações
+    }
+
+# Descarta o conteúdo do cache, forçando um novo download na próxima execução
+def _invalidar_cache_refs():
+    cache = _cache_refs()
+    with cache["lock"]:
+        cache["df"] = None
+        cache["posicoes"] = {}
+        cache["revisao"] = None
+        cache["deltas"] = []
+
+# Identifica a versão do DataFrame recebido: revisão do arquivo base mais os deltas aplicados,
+# lida junto com a tabela em cache. Retorna None se outra sessão já substituiu o DataFrame (uma
+# sessão pode estar no meio de uma execução com a tabela anterior); os índices dessa tabela
+# não entram nos caches, que são identificados pela revisão.
+def revisao_tabela(df):
+    cache = _cache_refs()
+    with cache["lock"]:
+        if cache["df"] is not df:
+            return None
+        ultimo_delta = cache["deltas"][-1]["name"] if cache["deltas"] else ""
+        return f"{cache['revisao']}|{ultimo_delta}"
+
+# Chave que identifica um arquivo de delta: o sufixo aleatório do nome
+def _chave_delta(nome):
+    return nome.removesuffix(".json").rsplit("_", 1)[-1]
+
+# Propriedades do arquivo base com as chaves dos deltas incorporados a ele, em blocos.
+# Os blocos sem uso recebem None, que os remove no Drive.
+def _propriedades_incorporados(chaves):
+    chaves = sorted(chaves)
+    blocos = [",".join(chaves[i:i + CHAVES_POR_BLOCO]) for i in range(0, len(chaves), CHAVES_POR_BLOCO)]
+    if len(blocos) > BLOCOS_INCORPORADOS:
+        raise ValueError(f"Há {len(chaves)} deltas para incorporar; o limite é {LIMITE_INCORPORADOS}.")
+    propriedades = {"incorporados": str(len(blocos))}
+    for i in range(BLOCOS_INCORPORADOS):
+        propriedades[f"incorporados_{i}"] = blocos[i] if i < len(blocos) else None
+    return propriedades
+
+# Chaves dos deltas incorporados ao arquivo base, a partir das suas propriedades
+def _ler_incorporados(app_properties):
+    chaves = set()
+    for i in range(int(app_properties.get("incorporados") or 0)):
+        chaves.update(filter(None, (app_properties.get(f"incorporados_{i}") or "").split(",")))
+    return chaves
+
+# Identifica o conteúdo atual do arquivo a partir dos seus metadados
+def _revisao_arquivo(metadados):
+    return f"{metadados.get('headRevisionId', '')}:{metadados.get('md5Checksum', '')}"
+
+# Converte as colunas para tipos compactos: categorias para campos com poucos valores
+# distintos e strings do Arrow para os demais textos
+def _ajustar_tipos(df):
+    tipos = {}
+    for coluna in df.columns:
+        if coluna in COLUNAS_CATEGORICAS:
+            if not isinstance(df[coluna].dtype, pd.CategoricalDtype):
+                tipos[coluna] = "category"
+        elif df[coluna].dtype == object or (
+            isinstance(df[coluna].dtype, pd.StringDtype) and df[coluna].dtype.storage != "pyarrow"
+        ):
+            tipos[coluna] = "string[pyarrow]"
+    return df.astype(tipos) if tipos else df
+
+# Garante que toda referência tenha um ID e acrescenta a marcação de exclusão (tombstone).
+# Linhas antigas, sem ID, recebem um ID derivado do conteúdo, o mesmo em qualquer instância do app.
+def _preparar_tabela(df):
+    if COLUNA_ID not in df:
+        df[COLUNA_ID] = pd.Series(pd.NA, index=df.index, dtype="string[pyarrow]")
+    sem_id = df[COLUNA_ID].isna().to_numpy()
+    if sem_id.any():
+        colunas = [coluna for coluna in df.columns if coluna not in (COLUNA_ID, COLUNA_EXCLUIDA)]
+        # Em blocos de LINHAS_POR_PARTE linhas, sem converter a tabela inteira para strings de uma vez
+        linhas = np.flatnonzero(sem_id)
+        hashes = pd.Series(np.concatenate([
+            pd.util.hash_pandas_object(df.iloc[linhas[i:i + LINHAS_POR_PARTE]][colunas].astype("string"), index=False).to_numpy()
+            for i in range(0, len(linhas), LINHAS_POR_PARTE)
+        ]))
+        ocorrencias = hashes.groupby(hashes).cumcount()  # Diferencia linhas com conteúdo idêntico
+        df.loc[sem_id, COLUNA_ID] = [f"{h:016x}-{o}" for h, o in zip(hashes, ocorrencias)]
+    df[COLUNA_EXCLUIDA] = False
+    return df
+
+# Índice hash das referências ativas: ID -> posição da linha
+def _indexar_ids(df):
+    ativas = np.flatnonzero(~_excluidas(df))
+    return dict(zip(df[COLUNA_ID].to_numpy()[ativas], ativas.tolist()))
+
+# Máscara das linhas excluídas que ainda aguardam a compactação
+def _excluidas(df):
+    if COLUNA_EXCLUIDA not in df:
+        return np.zeros(len(df), dtype=bool)
+    return df[COLUNA_EXCLUIDA].to_numpy(dtype=bool)
+
+# Strings do Arrow com "novos" (na mesma ordem de "posicoes", crescentes) nas posições indicadas.
+# Apenas os trechos de LINHAS_POR_PARTE linhas que contêm alguma posição são copiados; os demais
+# são compartilhados com o texto original.
+def _substituir_trechos(texto, posicoes, novos):
+    partes = []
+    inicio = 0
+    for bloco in np.unique(posicoes // LINHAS_POR_PARTE):
+        a, z = bloco * LINHAS_POR_PARTE, min((bloco + 1) * LINHAS_POR_PARTE, len(texto))
+        partes.extend(texto.slice(inicio, a - inicio).chunks)
+        trecho = texto.slice(a, z - a).combine_chunks()
+        no_trecho = np.flatnonzero((posicoes >= a) & (posicoes < z))
+        mascara = np.zeros(z - a, dtype=bool)
+        mascara[posicoes[no_trecho] - a] = True
+        partes.append(pc.replace_with_mask(trecho, pa.array(mascara), novos.take(no_trecho).cast(trecho.type)))
+        inicio = z
+    partes.extend(texto.slice(inicio).chunks)
+    return pa.chunked_array([parte for parte in partes if len(parte)], type=texto.type)
+
+# Nova série com os valores de "valores" ({posição: valor}) nas posições indicadas, sem alterar
+# a série recebida. Nas strings do Arrow, o restante da coluna é compartilhado com a original.
+def _substituir_valores(serie, valores):
+    posicoes = np.fromiter(valores, dtype=np.int64, count=len(valores))
+    ordem = np.argsort(posicoes)
+    posicoes = posicoes[ordem]
+    novos = pd.Series(list(valores.values()), dtype=object).iloc[ordem].to_numpy()
+    if isinstance(serie.array, pd.arrays.ArrowStringArray):
+        substitutos = pa.array([None if pd.isna(valor) else str(valor) for valor in novos], type=pa.large_string())
+        texto = _substituir_trechos(serie.array.__arrow_array__(), posicoes, substitutos)
+        return pd.Series(pd.arrays.ArrowStringArray(texto), index=serie.index, name=serie.name)
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        # Inclui de uma vez os valores que ainda não são categorias
+        faltantes = pd.Index(pd.Series(novos).dropna().unique()).difference(serie.cat.categories)
+        if len(faltantes):
+            serie = serie.cat.add_categories(list(faltantes))
+    serie = serie.copy()
+    serie.iloc[posicoes] = pd.array(novos, dtype=serie.dtype)
+    return serie
+
+# Aplica edições e exclusões sobre uma cópia do DataFrame, sem alterar o recebido (que pode
+# estar em uso por outras sessões). Todas as alterações do grupo geram uma única cópia de cada
+# coluna alterada; as demais colunas são compartilhadas com o DataFrame original.
+def _alterar_linhas(df, alteracoes, posicoes):
+    valores = {}  # Coluna -> {posição: novo valor}
+    for alteracao in alteracoes:
+        posicao = posicoes.get(alteracao["id"])
+        if posicao is None:
+            continue
+        if alteracao["op"] == "editar":
+            for coluna, valor in alteracao["registro"].items():
+                valores.setdefault(coluna, {})[posicao] = valor
+        else:
+            valores.setdefault(COLUNA_EXCLUIDA, {})[posicao] = True
+            posicoes.pop(df[COLUNA_ID].iat[posicao], None)
+    if not valores:
+        return df
+
+    df = df.copy(deep=False)
+    for coluna, novos in valores.items():
+        if coluna not in df:
+            df[coluna] = pd.Series(pd.NA, index=df.index, dtype="string[pyarrow]")
+        df[coluna] = _substituir_valores(df[coluna], novos)
+    return df
+
+# Acrescenta novos registros de uma só vez, com os mesmos tipos da tabela
+def _adicionar_registros(df, registros, posicoes):
+    novos = pd.DataFrame(registros)
+    if COLUNA_ID not in novos:
+        novos[COLUNA_ID] = pd.NA
+    # Inclui de uma vez as categorias novas de todos os registros, numa cópia rasa do DataFrame
+    df = df.copy(deep=False)
+    for coluna in novos.columns:
+        if coluna in df and isinstance(df[coluna].dtype, pd.CategoricalDtype):
+            faltantes = pd.Index(novos[coluna].dropna().unique()).difference(df[coluna].cat.categories)
+            if len(faltantes):
+                df[coluna] = df[coluna].cat.add_categories(list(faltantes))
+    novos = _preparar_tabela(novos)
+    novos = novos.astype({coluna: df[coluna].dtype for coluna in novos.columns if coluna in df})
+
+    inicio = len(df)
+    df = pd.concat([df, novos], ignore_index=True)
+    posicoes.update(zip(novos[COLUNA_ID], range(inicio, len(df))))
+    return df
+
+# Alterações de um lote na ordem em que foram feitas, abrindo os lotes contidos nele (um lote
+# gravado pela thread de escrita pode incluir o lote enviado por uma sessão)
+def _itens_lote(alteracao):
+    if alteracao["op"] != "lote":
+        return [alteracao]
+    return [item for contida in alteracao["alteracoes"] for item in _itens_lote(contida)]
+
+# Aplica uma alteração (adicionar, editar, excluir ou um lote delas) e retorna o novo
+# DataFrame; o recebido nunca é alterado. Exclusões apenas marcam a linha; "posicoes" é
+# atualizado junto.
+def _aplicar_alteracao(df, alteracao, posicoes):
+    if alteracao["op"] == "lote":
+        # Adições consecutivas do lote são acrescentadas com um único concat, e edições e
+        # exclusões consecutivas (pelo ID) são aplicadas com uma única cópia das colunas
+        grupo, tipo_grupo = [], None
+        for item in _itens_lote(alteracao) + [{"op": "fim"}]:
+            if item["op"] == "adicionar":
+                tipo = "adicionar"
+            elif item["op"] in ("editar", "excluir"):
+                tipo = "alterar"
+            elif item["op"] == "fim":
+                tipo = None
+            else:
+                raise ValueError(f"Operação desconhecida: {item['op']}")
+            if grupo and tipo != tipo_grupo:
+                if tipo_grupo == "adicionar":
+                    df = _adicionar_registros(df, [item_grupo["registro"] for item_grupo in grupo], posicoes)
+                else:
+                    df = _alterar_linhas(df, grupo, posicoes)
+                grupo = []
+            grupo.append(item)
+            tipo_grupo = tipo
+        return df
+    if alteracao["op"] == "adicionar":
+        return _adicionar_registros(df, [alteracao["registro"]], posicoes)
+    if alteracao["op"] in ("editar", "excluir"):
+        return _alterar_linhas(df, [alteracao], posicoes)
+    raise ValueError(f"Operação desconhecida: {alteracao['op']}")
+
+# Posição atual da referência com o ID informado (None se não existir mais)
+def posicao_referencia(refs, id_referencia):
+    cache = _cache_refs()
+    with cache["lock"]:
+        if cache["df"] is refs:
+            return cache["posicoes"].get(id_referencia)
+    return _indexar_ids(refs).get(id_referencia)
+
+# Interface comum dos armazenamentos da tabela de referências. Todos compartilham o cache
+# de _cache_refs; a escolha do armazenamento é feita em obter_armazenamento().
+class ArmazenamentoRefs:
+    nome = ""
+
+    # Sincroniza o cache com o armazenamento e retorna a tabela (None se ela não existir).
+    # Se a tabela for lida em partes, as colunas em "indexar" são indexadas à medida que
+    # chegam e "ao_carregar_parte" é chamado a cada parte lida.
+    def atualizar_cache(self, ao_carregar_parte=None, indexar=()):
+        raise NotImplementedError
+
+    # Grava um lote de alterações e retorna True quando for hora de compactar. A "chave"
+    # identifica o lote entre tentativas, para que uma nova tentativa não o grave duas vezes.
+    def gravar_lote(self, alteracoes, chave=None):
+        raise NotImplementedError
+
+    # Substitui a tabela inteira pelo DataFrame informado
+    def enviar_tabela(self, df):
+        raise NotImplementedError
+
+    # Incorpora as alterações acumuladas e remove de fato as linhas excluídas
+    def compactar(self):
+        pass
+
+    # Posições das linhas cuja coluna contém o termo; por padrão usa o índice em memória
+    def buscar(self, df, coluna, termo, case_sensitive=False, candidatas=None):
+        return buscar_posicoes(df, coluna, termo, case_sensitive=case_sensitive, candidatas=candidatas)
+
+# Armazenamento baseado em arquivos: um arquivo base (snapshot Parquet ou CSV) mais pequenos
+# arquivos de delta com as alterações, compactados de tempos em tempos. As subclasses
+# implementam apenas as operações básicas sobre arquivos (_listar, _ler_tabela, _ler_bytes,
+# _criar, _atualizar, _metadados e _excluir) e, opcionalmente, a leitura em partes (_ler_partes).
+class ArmazenamentoArquivos(ArmazenamentoRefs):
+    # Lê a tabela em partes (DataFrames com linhas consecutivas); por padrão, de uma só vez
+    def _ler_partes(self, arquivo):
+        yield self._ler_tabela(arquivo)
+
+    # Lê o arquivo base parte por parte, indexando as colunas em "indexar" assim que cada
+    # parte chega, para que a tabela e esses índices fiquem prontos juntos.
+    # Retorna a tabela e os índices.
+    def _carregar_base(self, base, ao_carregar_parte=None, indexar=()):
+        partes = []
+        indexacao = {coluna: _nova_indexacao() for coluna in indexar if coluna in COLUNAS_INDEXADAS}
+        inicio = 0
+        with medir_etapa("leitura_tabela") as medida:
+            for parte in self._ler_partes(base):
+                # Textos viram strings do Arrow já na parte, sem manter objetos Python até o fim
+                parte = parte.astype({coluna: "string[pyarrow]" for coluna in parte.columns if parte[coluna].dtype == object})
+                parte.index = pd.RangeIndex(inicio, inicio + len(parte))
+                normalizados = {
+                    coluna: _indexar_parte(indexacao[coluna], parte[coluna], inicio)
+                    for coluna in indexacao if coluna in parte
+                }
+                partes.append(parte)
+                inicio += len(parte)
+                if ao_carregar_parte:
+                    ao_carregar_parte(parte, normalizados)
+            medida["linhas"] = inicio
+
+        df = pd.concat(partes, ignore_index=True) if partes else pd.DataFrame()
+        df = _preparar_tabela(_ajustar_tipos(df))
+        indices = {coluna: _concluir_indexacao(indexacao[coluna], df[coluna]) for coluna in indexacao if coluna in df}
+        return df, indices
+
+    # Lista o arquivo base, os deltas ainda não incorporados a ele e os já incorporados (que
+    # ainda não foram removidos). Retorna também as chaves dos deltas incorporados.
+    def _listar_arquivos_refs(self):
+        arquivos = self._listar()
+        csv = next((arquivo for arquivo in arquivos if arquivo["name"] == FILE_NAME), None)
+        snapshot = next((arquivo for arquivo in arquivos if arquivo["name"] == SNAPSHOT_NAME), None)
+        # O snapshot só é usado enquanto corresponder ao CSV atual (o CSV pode ter sido editado fora do app)
+        md5_snapshot = ((snapshot or {}).get("appProperties") or {}).get("md5_csv")
+        if snapshot and (csv is None or md5_snapshot == csv.get("md5Checksum")):
+            base = snapshot
+        else:
+            base = csv
+
+        # O arquivo base lista as chaves dos deltas que já fazem parte dele. Um delta gravado por
+        # outra instância pode aparecer depois de outros com nome maior, então a lista é exata.
+        incorporados = _ler_incorporados((base or {}).get("appProperties") or {})
+        deltas, antigos = [], []
+        for arquivo in sorted(arquivos, key=lambda arquivo: arquivo["name"]):
+            if not arquivo["name"].startswith(PREFIXO_DELTA):
+                continue
+            if _chave_delta(arquivo["name"]) in incorporados:
+                antigos.append(arquivo)
+            else:
+                deltas.append(arquivo)
+        ids = {arquivo["name"]: arquivo["id"] for arquivo in (csv, snapshot) if arquivo}
+        return base, deltas, ids, incorporados, antigos
+
+    def atualizar_cache(self, ao_carregar_parte=None, indexar=()):
+        # Apenas os metadados são consultados; o arquivo base só é lido quando sua
+        # revisão muda e, dos deltas, apenas os que ainda não foram aplicados.
+        # Um carregamento por vez: os downloads acontecem fora do lock do cache, e as
+        # sessões continuam usando a cópia atual até a nova ficar pronta.
+        cache = _cache_refs()
+        with cache["lock_carga"]:
+            for tentativa in itertools.count(1):
+                base, deltas, ids, incorporados, antigos = self._listar_arquivos_refs()
+                revisao = _revisao_arquivo(base) if base else None
+                nomes_deltas = [delta["name"] for delta in deltas]
+                with cache["lock"]:
+                    cache["ids"] = ids
+                    cache["incorporados"] = incorporados
+                    cache["deltas_incorporados"] = [{"name": delta["name"], "id": delta["id"]} for delta in antigos]
+                    if base is None and not deltas:
+                        return None
+                    aplicados = [delta["name"] for delta in cache["deltas"]]
+                    recarregar = cache["df"] is None or cache["revisao"] != revisao or nomes_deltas[:len(aplicados)] != aplicados
+                    pendentes = deltas if recarregar else deltas[len(aplicados):]
+
+                if recarregar:
+                    df, indices = self._carregar_base(base, ao_carregar_parte, indexar) if base else (_preparar_tabela(pd.DataFrame()), {})
+                try:
+                    alteracoes = [json.loads(self._ler_bytes(delta["id"])) for delta in pendentes]
+                except Exception:
+                    # Uma compactação pode ter removido o delta depois da listagem; lista de novo
+                    if tentativa < TENTATIVAS_ESCRITA:
+                        continue
+                    raise
+
+                with cache["lock"]:
+                    # A thread de escrita pode ter aplicado um delta nesse intervalo; nesse caso, recomeça
+                    if not recarregar and [delta["name"] for delta in cache["deltas"]] != aplicados:
+                        continue
+                    if recarregar:
+                        cache["df"] = df
+                        cache["indices"].update(indices)
+                        cache["posicoes"] = _indexar_ids(df)
+                        cache["base"] = base["name"] if base else None
+                        cache["revisao"] = revisao
+                        cache["deltas"] = []
+                    for delta, alteracao in zip(pendentes, alteracoes):
+                        cache["df"] = _aplicar_alteracao(cache["df"], alteracao, cache["posicoes"])
+                        cache["deltas"].append({"name": delta["name"], "id": delta["id"]})
+                    return cache["df"]
+
+    # Cria ou atualiza um arquivo, reaproveitando o id já conhecido pelo cache
+    def _enviar_arquivo(self, nome, conteudo, mimetype, app_properties=None):
+        cache = _cache_refs()
+        file_id = cache["ids"].get(nome)
+        if file_id:
+            metadados = self._atualizar(file_id, conteudo, mimetype, app_properties)
+        else:
+            metadados = self._criar(nome, conteudo, mimetype, app_properties)
+        with cache["lock"]:
+            cache["ids"][nome] = metadados["id"]
+        return metadados
+
+    # Grava o CSV e o snapshot Parquet completos, registrando os arquivos de delta em
+    # "incorporados" como parte deles. Com "revisao_esperada", confere antes de enviar se o
+    # arquivo base ainda está na revisão lida (escrita otimista).
+    def enviar_tabela(self, df, incorporados=(), revisao_esperada=None):
+        # As linhas excluídas são removidas de fato apenas aqui
+        df = df.loc[~_excluidas(df)].drop(columns=COLUNA_EXCLUIDA, errors="ignore").reset_index(drop=True)
+        chaves = {_chave_delta(delta["name"]) for delta in incorporados}
+        app_properties = _propriedades_incorporados(chaves)
+        csv_buffer = io.StringIO()
+        df.to_csv(csv_buffer, index=False)
+        parquet_buffer = io.BytesIO()
+        df.to_parquet(parquet_buffer, index=False)
+
+        cache = _cache_refs()
+        if not cache["ids"]:
+            # Sem uma leitura anterior, descobre quais arquivos já existem para não duplicá-los
+            cache["ids"] = self._listar_arquivos_refs()[2]
+        if revisao_esperada is not None and cache["base"] in cache["ids"]:
+            atual = self._metadados(cache["ids"][cache["base"]])
+            if _revisao_arquivo(atual) != revisao_esperada:
+                raise ConflitoEscrita("O arquivo base foi alterado por outra instância do app.")
+
+        # O CSV continua sendo o formato de exportação e interoperabilidade
+        metadados = self._enviar_arquivo(FILE_NAME, csv_buffer.getvalue().encode(), "text/csv", app_properties)
+        # O snapshot Parquet, menor e já tipado, é o que o app carrega
+        app_properties = dict(app_properties, md5_csv=metadados.get("md5Checksum", ""))
+        metadados = self._enviar_arquivo(
+            SNAPSHOT_NAME, parquet_buffer.getvalue(), "application/vnd.apache.parquet", app_properties
+        )
+
+        # Atualiza o cache com a nova revisão para não ler de novo o que acabou de ser enviado
+        df = _preparar_tabela(_ajustar_tipos(df))
+        with cache["lock"]:
+            cache["df"] = df
+            cache["posicoes"] = _indexar_ids(df)
+            cache["base"] = SNAPSHOT_NAME
+            cache["revisao"] = _revisao_arquivo(metadados)
+            cache["deltas"] = []
+            cache["incorporados"] = chaves
+            cache["deltas_incorporados"] = [{"name": delta["name"], "id": delta["id"]} for delta in incorporados]
+
+    # Incorpora os deltas acumulados ao arquivo base e remove os arquivos de delta.
+    # Se outra instância alterar o arquivo base no meio do caminho, recomeça a partir do novo estado.
+    def compactar(self):
+        for tentativa in range(TENTATIVAS_ESCRITA):
+            self.atualizar_cache()  # Garante que o cache contém todos os deltas publicados
+            cache = _cache_refs()
+            with cache["lock"]:
+                df = cache["df"]
+                revisao = cache["revisao"]
+                deltas = list(cache["deltas"])
+                antigos = list(cache["deltas_incorporados"])
+            if df is None:
+                return
+
+            # Deltas incorporados numa compactação anterior e não removidos: remove-os agora
+            # e continua registrando no arquivo base os que não puderam ser removidos
+            restantes = self._excluir_deltas(antigos)
+            # O arquivo base registra no máximo LIMITE_INCORPORADOS deltas: os mais antigos são
+            # incorporados agora e os demais ficam para a próxima compactação
+            incorporar = deltas[:max(LIMITE_INCORPORADOS - len(restantes), 0)]
+            if not incorporar:
+                with cache["lock"]:
+                    cache["deltas_incorporados"] = restantes
+                return
+            try:
+                if len(incorporar) < len(deltas):
+                    df = self._tabela_com_deltas(revisao, incorporar)
+                self.enviar_tabela(df, incorporados=incorporar + restantes, revisao_esperada=revisao)
+            except ConflitoEscrita:
+                continue
+            restantes = self._excluir_deltas(incorporar + restantes)
+            with cache["lock"]:
+                cache["deltas_incorporados"] = restantes
+            if len(incorporar) < len(deltas):
+                self.atualizar_cache()  # Reaplica no cache os deltas que ficaram de fora
+            return
+        raise ConflitoEscrita("Não foi possível compactar os deltas: o arquivo base mudou a cada tentativa.")
+
+    # Lê a tabela atual (arquivo base mais deltas pendentes) sem passar pelo cache; None se ela não existir
+    def ler_tabela(self):
+        base, deltas = self._listar_arquivos_refs()[:2]
+        if base is None and not deltas:
+            return None
+        return self._tabela_com_deltas(_revisao_arquivo(base) if base else None, deltas)
+
+    # Relê o arquivo base (que deve estar na revisão informada) e aplica apenas os deltas indicados
+    def _tabela_com_deltas(self, revisao, deltas):
+        base = self._listar_arquivos_refs()[0]
+        if (_revisao_arquivo(base) if base else None) != revisao:
+            raise ConflitoEscrita("O arquivo base foi alterado por outra instância do app.")
+        df = self._carregar_base(base)[0] if base else _preparar_tabela(pd.DataFrame())
+        posicoes = _indexar_ids(df)
+        for delta in deltas:
+            df = _aplicar_alteracao(df, json.loads(self._ler_bytes(delta["id"])), posicoes)
+        return df
+
+    # Remove os arquivos de delta informados; retorna os que não puderam ser removidos
+    def _excluir_deltas(self, deltas):
+        restantes = []
+        for delta in deltas:
+            try:
+                self._excluir(delta["id"])
+            except Exception:
+                # Pode já ter sido removido por outra compactação; a próxima listagem confirma
+                restantes.append(delta)
+        return restantes
+
+    # Grava o lote como um único arquivo de delta, sobre o estado mais recente do armazenamento
+    def gravar_lote(self, alteracoes, chave=None):
+        chave = chave or uuid.uuid4().hex[:12]
+        # Sincroniza antes de gravar; as alterações localizam suas linhas pelo ID
+        self.atualizar_cache()
+        cache = _cache_refs()
+        with cache["lock"]:
+            revisao = cache["revisao"]
+            aplicados = [delta["name"] for delta in cache["deltas"]]
+            # Uma tentativa anterior pode ter criado o delta sem receber a resposta: nesse caso
+            # ele já foi lido acima (ou até incorporado ao arquivo base) e não é gravado de novo
+            if chave in cache["incorporados"] or chave in map(_chave_delta, aplicados):
+                return len(cache["deltas"]) >= LIMITE_DELTAS
+
+        alteracao = alteracoes[0] if len(alteracoes) == 1 else {"op": "lote", "alteracoes": alteracoes}
+        nome = f"{PREFIXO_DELTA}{time.time_ns():020d}_{chave}.json"
+        delta = self._criar(nome, json.dumps(alteracao, ensure_ascii=False).encode(), "application/json")
+
+        # Aplica o lote também no cache, evitando lê-lo de volta. Se o cache mudou nesse
+        # intervalo, o delta é incorporado normalmente na próxima leitura.
+        with cache["lock"]:
+            if cache["df"] is not None and cache["revisao"] == revisao and [d["name"] for d in cache["deltas"]] == aplicados:
+                cache["df"] = _aplicar_alteracao(cache["df"], alteracao, cache["posicoes"])
+                cache["deltas"].append({"name": delta["name"], "id": delta["id"]})
+            return len(cache["deltas"]) >= LIMITE_DELTAS
+
+# Arquivo somente leitura que baixa o conteúdo do Drive sob demanda, uma parte de
+# "tamanho_parte" bytes por vez: apenas a parte atual fica na memória
+class _FluxoDownload(io.RawIOBase):
+    def __init__(self, request, tamanho_parte):
+        self._parte = io.BytesIO()
+        self._downloader = MediaIoBaseDownload(self._parte, request, chunksize=tamanho_parte)
+        self._dados = b""
+        self._posicao = 0
+        self._concluido = False
+        self.bytes_baixados = 0
+        self.tempo_download = 0.0
+
+    def readable(self):
+        return True
+
+    def readinto(self, destino):
+        while self._posicao >= len(self._dados):
+            if self._concluido:
+                return 0
+            self._parte.seek(0)
+            self._parte.truncate()
+            inicio = time.perf_counter()
+            status, self._concluido = self._downloader.next_chunk()
+            self.tempo_download += time.perf_counter() - inicio
+            self._dados = self._parte.getvalue()
+            self._posicao = 0
+            self.bytes_baixados += len(self._dados)
+        quantidade = min(len(destino), len(self._dados) - self._posicao)
+        destino[:quantidade] = memoryview(self._dados)[self._posicao:self._posicao + quantidade]
+        self._posicao += quantidade
+        return quantidade
+
+# Armazenamento na pasta "dados_refs" do Google Drive
+class ArmazenamentoDrive(ArmazenamentoArquivos):
+    nome = "Google Drive"
+
+    def __init__(self, service):
+        self.service = service
+
+    def _listar(self):
+        query = (
+            f"'{FOLDER_ID}' in parents and trashed = false and "
+            f"(name = '{FILE_NAME}' or name = '{SNAPSHOT_NAME}' or name contains '{PREFIXO_DELTA}')"
+        )
+        fields = "nextPageToken, files(id, name, md5Checksum, headRevisionId, appProperties)"
+        arquivos = []
+        page_token = None
+        with medir_etapa("drive_listagem") as medida:
+            while True:
+                response = self.service.files().list(q=query, fields=fields, pageSize=1000, pageToken=page_token).execute()
+                arquivos.extend(response.get("files", []))
+                page_token = response.get("nextPageToken")
+                if not page_token:
+                    break
+            medida["linhas"] = len(arquivos)
+        return arquivos
+
+    def _ler_tabela(self, arquivo):
+        with medir_etapa("drive_download") as medida:
+            request = self.service.files().get_media(fileId=arquivo["id"])
             fh = io.BytesIO()
-            downloader = MediaIoBaseDownload(fh, request)
+            downloader = MediaIoBaseDownload(fh, request, chunksize=TAMANHO_PARTE_DOWNLOAD)
             done = False
             while done is False:
                 status, done = downloader.next_chunk()
-            fh.seek(0)
-            return pd.read_csv(fh)
+            medida["bytes"] = fh.tell()
+        fh.seek(0)
+        return pd.read_parquet(fh) if arquivo["name"] == SNAPSHOT_NAME else pd.read_csv(fh)
+
+    # O CSV é interpretado à medida que é baixado, sem guardar o arquivo inteiro na memória
+    def _ler_partes(self, arquivo):
+        if arquivo["name"] == SNAPSHOT_NAME:
+            yield self._ler_tabela(arquivo)
+            return
+        fluxo = _FluxoDownload(self.service.files().get_media(fileId=arquivo["id"]), TAMANHO_PARTE_DOWNLOAD)
+        yield from pd.read_csv(io.BufferedReader(fluxo), chunksize=LINHAS_POR_PARTE)
+        _registrar_etapa("drive_download", fluxo.tempo_download, {"linhas": None, "bytes": fluxo.bytes_baixados})
+
+    def _ler_bytes(self, file_id):
+        return self.service.files().get_media(fileId=file_id).execute()
+
+    def _criar(self, nome, conteudo, mimetype, app_properties=None):
+        file_metadata = {"name": nome, "parents": [FOLDER_ID]}
+        if app_properties:
+            # Propriedades None só servem para remover as existentes (em _atualizar)
+            file_metadata["appProperties"] = {chave: valor for chave, valor in app_properties.items() if valor is not None}
+        media = MediaIoBaseUpload(io.BytesIO(conteudo), mimetype=mimetype)
+        return self.service.files().create(
+            body=file_metadata, media_body=media, fields="id, name, md5Checksum, headRevisionId"
+        ).execute()
+
+    def _atualizar(self, file_id, conteudo, mimetype, app_properties=None):
+        file_metadata = {"appProperties": app_properties} if app_properties else {}
+        media = MediaIoBaseUpload(io.BytesIO(conteudo), mimetype=mimetype)
+        return self.service.files().update(
+            fileId=file_id, body=file_metadata, media_body=media, fields="id, name, md5Checksum, headRevisionId"
+        ).execute()
+
+    def _metadados(self, file_id):
+        return self.service.files().get(fileId=file_id, fields="md5Checksum, headRevisionId").execute()
+
+    def _excluir(self, file_id):
+        self.service.files().delete(fileId=file_id).execute()
+
+# Armazenamento em um diretório local, com os mesmos arquivos usados no Drive. As tabelas são
+# lidas por mapeamento em memória e as propriedades de cada arquivo ficam em "<arquivo>.props".
+class ArmazenamentoLocal(ArmazenamentoArquivos):
+    nome = "diretório local"
+
+    def __init__(self, diretorio):
+        self.diretorio = diretorio
+        os.makedirs(diretorio, exist_ok=True)
+
+    def _caminho(self, nome):
+        return os.path.join(self.diretorio, nome)
+
+    # Metadados no mesmo formato do Drive; a revisão é derivada do tamanho e da data de modificação
+    def _metadados(self, nome):
+        info = os.stat(self._caminho(nome))
+        app_properties = {}
+        if os.path.exists(self._caminho(nome) + ".props"):
+            with open(self._caminho(nome) + ".props", encoding="utf-8") as arquivo:
+                app_properties = json.load(arquivo)
+        return {
+            "id": nome,
+            "name": nome,
+            "md5Checksum": f"{info.st_size}-{info.st_mtime_ns}",
+            "headRevisionId": str(info.st_mtime_ns),
+            "appProperties": app_properties,
+        }
+
+    def _listar(self):
+        return [
+            self._metadados(nome) for nome in os.listdir(self.diretorio)
+            if nome in (FILE_NAME, SNAPSHOT_NAME) or (nome.startswith(PREFIXO_DELTA) and nome.endswith(".json"))
+        ]
+
+    def _ler_tabela(self, arquivo):
+        if arquivo["name"] == SNAPSHOT_NAME:
+            return pd.read_parquet(self._caminho(arquivo["name"]), memory_map=True)
+        return pd.read_csv(self._caminho(arquivo["name"]), memory_map=True)
+
+    def _ler_partes(self, arquivo):
+        if arquivo["name"] == SNAPSHOT_NAME:
+            yield self._ler_tabela(arquivo)
+            return
+        yield from pd.read_csv(self._caminho(arquivo["name"]), memory_map=True, chunksize=LINHAS_POR_PARTE)
+
+    def _ler_bytes(self, nome):
+        with open(self._caminho(nome), "rb") as arquivo:
+            return arquivo.read()
+
+    # Grava em um arquivo temporário e o renomeia, para que leitores nunca vejam um arquivo pela metade
+    def _gravar(self, nome, conteudo, app_properties=None):
+        if app_properties:
+            # As propriedades são substituídas por inteiro; as marcadas com None são descartadas
+            with open(self._caminho(nome) + ".props", "w", encoding="utf-8") as arquivo:
+                json.dump({chave: valor for chave, valor in app_properties.items() if valor is not None}, arquivo)
+        temporario = self._caminho(f".{nome}.{uuid.uuid4().hex[:8]}.tmp")
+        with open(temporario, "wb") as arquivo:
+            arquivo.write(conteudo)
+        os.replace(temporario, self._caminho(nome))
+        return self._metadados(nome)
+
+    def _criar(self, nome, conteudo, mimetype, app_properties=None):
+        return self._gravar(nome, conteudo, app_properties)
+
+    def _atualizar(self, nome, conteudo, mimetype, app_properties=None):
+        return self._gravar(nome, conteudo, app_properties)
+
+    def _excluir(self, nome):
+        os.remove(self._caminho(nome))
+        if os.path.exists(self._caminho(nome) + ".props"):
+            os.remove(self._caminho(nome) + ".props")
+
+# Valor do contador de revisão do banco, a partir da revisão "sqlite:N" (ver ArmazenamentoSQLite)
+def _numero_revisao(revisao):
+    return int(revisao.rsplit(":", 1)[1])
+
+# Armazenamento em um banco SQLite local. Cada alteração é gravada diretamente na tabela
+# "refs", e a tabela FTS5 "refs_fts" (tokenizador trigram, texto normalizado) atende às
+# buscas por substring das colunas de busca sem carregar o índice em memória.
+class ArmazenamentoSQLite(ArmazenamentoRefs):
+    nome = "SQLite"
+
+    # Cria o esquema; como o objeto é compartilhado (ver _criar_armazenamento), roda uma vez por processo
+    def __init__(self, caminho):
+        self.caminho = caminho
+        with closing(self._conectar()) as conexao, conexao:
+            conexao.execute("PRAGMA journal_mode=WAL")  # Persistente: vale para as próximas conexões
+            colunas = ", ".join(f"{coluna} TEXT" for coluna in COLUNAS_REFS)
+            conexao.execute(f"CREATE TABLE IF NOT EXISTS refs (seq INTEGER PRIMARY KEY, {COLUNA_ID} TEXT UNIQUE NOT NULL, {colunas})")
+            conexao.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS refs_fts USING fts5({', '.join(COLUNAS_BUSCA)}, tokenize='trigram')")
+            conexao.execute("CREATE TABLE IF NOT EXISTS meta (chave TEXT PRIMARY KEY, valor INTEGER)")
+            conexao.execute("INSERT OR IGNORE INTO meta VALUES ('revisao', 0)")
+            conexao.execute("INSERT OR IGNORE INTO meta VALUES ('importado', 0)")
+
+    def _conectar(self):
+        return sqlite3.connect(self.caminho, timeout=TEMPO_LIMITE_ESCRITA)
+
+    # Importa a tabela de um armazenamento de arquivos ("origem") uma única vez, na primeira
+    # execução com um banco vazio; um banco que já tem referências apenas é marcado como importado
+    def importar(self, origem):
+        with closing(self._conectar()) as conexao:
+            if conexao.execute("SELECT valor FROM meta WHERE chave = 'importado'").fetchone()[0]:
+                return
+            vazio = conexao.execute("SELECT 1 FROM refs LIMIT 1").fetchone() is None
+        df = origem.ler_tabela() if vazio else None
+        if df is not None:
+            self.enviar_tabela(df)
+        with closing(self._conectar()) as conexao, conexao:
+            conexao.execute("UPDATE meta SET valor = 1 WHERE chave = 'importado'")
+
+    def _revisao(self, conexao):
+        valor = conexao.execute("SELECT valor FROM meta WHERE chave = 'revisao'").fetchone()[0]
+        return f"sqlite:{valor}"
+
+    def atualizar_cache(self, ao_carregar_parte=None, indexar=()):
+        # Apenas o contador de revisão é consultado; a tabela só é lida quando ele muda.
+        # Um carregamento por vez: a leitura acontece fora do lock do cache, e as sessões
+        # continuam usando a cópia atual até a nova ficar pronta.
+        cache = _cache_refs()
+        with cache["lock_carga"]:
+            with closing(self._conectar()) as conexao:
+                conexao.execute("BEGIN")  # A revisão e a tabela são lidas do mesmo estado do banco
+                revisao = self._revisao(conexao)
+                with cache["lock"]:
+                    if cache["df"] is not None and cache["revisao"] == revisao:
+                        return cache["df"]
+                with medir_etapa("leitura_tabela") as medida:
+                    df = pd.read_sql_query(f"SELECT {COLUNA_ID}, {', '.join(COLUNAS_REFS)} FROM refs ORDER BY seq", conexao)
+                    medida["linhas"] = len(df)
+            df = _preparar_tabela(_ajustar_tipos(df))
+            posicoes = _indexar_ids(df)
+
+            with cache["lock"]:
+                # A thread de escrita pode ter levado o cache a uma revisão mais nova nesse intervalo
+                if cache["df"] is None or cache["revisao"] is None or _numero_revisao(cache["revisao"]) < _numero_revisao(revisao):
+                    cache["df"] = df
+                    cache["posicoes"] = posicoes
+                    cache["base"] = None
+                    cache["revisao"] = revisao
+                    cache["deltas"] = []
+                return cache["df"]
+
+    # Reescreve o texto normalizado de uma linha no índice FTS5
+    def _indexar_linha(self, conexao, seq):
+        valores = conexao.execute(f"SELECT {', '.join(COLUNAS_BUSCA)} FROM refs WHERE seq = ?", (seq,)).fetchone()
+        conexao.execute("DELETE FROM refs_fts WHERE rowid = ?", (seq,))
+        conexao.execute(
+            f"INSERT INTO refs_fts (rowid, {', '.join(COLUNAS_BUSCA)}) VALUES (?{', ?' * len(COLUNAS_BUSCA)})",
+            (seq, *(normalizar_texto(valor) if valor is not None else "" for valor in valores)),
+        )
+
+    def _gravar_alteracao(self, conexao, alteracao):
+        if alteracao["op"] == "lote":
+            for item in alteracao["alteracoes"]:
+                self._gravar_alteracao(conexao, item)
+        elif alteracao["op"] == "adicionar":
+            registro = {coluna: valor for coluna, valor in alteracao["registro"].items() if coluna in COLUNAS_REFS + [COLUNA_ID]}
+            cursor = conexao.execute(
+                f"INSERT INTO refs ({', '.join(registro)}) VALUES ({', '.join('?' * len(registro))})",
+                list(registro.values()),
+            )
+            self._indexar_linha(conexao, cursor.lastrowid)
+        elif alteracao["op"] == "editar":
+            registro = {coluna: valor for coluna, valor in alteracao["registro"].items() if coluna in COLUNAS_REFS}
+            conexao.execute(
+                f"UPDATE refs SET {', '.join(f'{coluna} = ?' for coluna in registro)} WHERE {COLUNA_ID} = ?",
+                [*registro.values(), alteracao["id"]],
+            )
+            linha = conexao.execute(f"SELECT seq FROM refs WHERE {COLUNA_ID} = ?", (alteracao["id"],)).fetchone()
+            if linha:
+                self._indexar_linha(conexao, linha[0])
+        elif alteracao["op"] == "excluir":
+            linha = conexao.execute(f"SELECT seq FROM refs WHERE {COLUNA_ID} = ?", (alteracao["id"],)).fetchone()
+            if linha:
+                conexao.execute("DELETE FROM refs WHERE seq = ?", (linha[0],))
+                conexao.execute("DELETE FROM refs_fts WHERE rowid = ?", (linha[0],))
         else:
+            raise ValueError(f"Operação desconhecida: {alteracao['op']}")
+
+    # Cada lote é uma única transação: se ela falhar, nada é gravado e a nova tentativa é segura
+    def gravar_lote(self, alteracoes, chave=None):
+        # Novos registros recebem o ID aqui, para que o banco e o cache usem o mesmo
+        for alteracao in alteracoes:
+            if alteracao["op"] == "adicionar":
+                alteracao["registro"].setdefault(COLUNA_ID, uuid.uuid4().hex)
+        alteracao = alteracoes[0] if len(alteracoes) == 1 else {"op": "lote", "alteracoes": alteracoes}
+
+        with closing(self._conectar()) as conexao:
+            with conexao:  # Uma única transação para o lote inteiro
+                revisao_anterior = self._revisao(conexao)
+                self._gravar_alteracao(conexao, alteracao)
+                conexao.execute("UPDATE meta SET valor = valor + 1 WHERE chave = 'revisao'")
+                revisao = self._revisao(conexao)
+
+        # Aplica o lote também no cache, se ele estava na revisão anterior à gravação
+        cache = _cache_refs()
+        with cache["lock"]:
+            if cache["df"] is not None and cache["revisao"] == revisao_anterior:
+                cache["df"] = _aplicar_alteracao(cache["df"], alteracao, cache["posicoes"])
+                cache["revisao"] = revisao
+            return cache["df"] is not None and int(_excluidas(cache["df"]).sum()) >= LIMITE_DELTAS
+
+    def enviar_tabela(self, df):
+        df = df.loc[~_excluidas(df)]
+        with closing(self._conectar()) as conexao, conexao:
+            conexao.execute("DELETE FROM refs")
+            conexao.execute("DELETE FROM refs_fts")
+            self._gravar_alteracao(conexao, {"op": "lote", "alteracoes": [
+                {"op": "adicionar", "registro": {coluna: None if pd.isna(valor) else valor for coluna, valor in registro.items()}}
+                for registro in _preparar_tabela(df.drop(columns=COLUNA_EXCLUIDA, errors="ignore")).drop(columns=COLUNA_EXCLUIDA).to_dict("records")
+            ]})
+            conexao.execute("UPDATE meta SET valor = valor + 1 WHERE chave = 'revisao'")
+        _invalidar_cache_refs()
+
+    # As exclusões já foram aplicadas no banco; basta otimizar o índice e reler a tabela sem elas
+    def compactar(self):
+        with closing(self._conectar()) as conexao, conexao:
+            conexao.execute("INSERT INTO refs_fts (refs_fts) VALUES ('optimize')")
+        _invalidar_cache_refs()
+
+    def buscar(self, df, coluna, termo, case_sensitive=False, candidatas=None):
+        if coluna not in COLUNAS_BUSCA:
+            return super().buscar(df, coluna, termo, case_sensitive=case_sensitive, candidatas=candidatas)
+
+        # O índice trigram guarda o texto normalizado e só atende o LIKE de dois argumentos (sem
+        # ESCAPE). Se o termo tiver "%" ou "_", o LIKE os trata como curingas e seleciona um
+        # superconjunto, conferido com instr(). A busca sensível a maiúsculas/minúsculas confere
+        # o termo exato no texto original.
+        termo_normalizado = normalizar_texto(termo)
+        sql = f"SELECT r.{COLUNA_ID} FROM refs_fts f JOIN refs r ON r.seq = f.rowid WHERE f.{coluna} LIKE ?"
+        parametros = [f"%{termo_normalizado}%"]
+        if "%" in termo_normalizado or "_" in termo_normalizado:
+            sql += f" AND instr(f.{coluna}, ?) > 0"
+            parametros.append(termo_normalizado)
+        if case_sensitive:
+            sql += f" AND instr(r.{coluna}, ?) > 0"
+            parametros.append(termo)
+        with closing(self._conectar()) as conexao:
+            ids = [linha[0] for linha in conexao.execute(sql, parametros)]
+
+        # Converte os IDs encontrados em posições do DataFrame pelo índice hash
+        cache = _cache_refs()
+        with cache["lock"]:
+            posicoes = cache["posicoes"] if cache["df"] is df else None
+        if posicoes is None:
+            posicoes = _indexar_ids(df)
+        resultado = np.array(sorted(posicoes[i] for i in ids if i in posicoes), dtype=np.int32)
+        if candidatas is not None:
+            resultado = np.intersect1d(resultado, candidatas)
+        return resultado
+
+# Cria o armazenamento configurado em REFS_ARMAZENAMENTO, sem mensagens na tela (usado também
+# pelas threads de carregamento). É um por processo: o estado fica todo em _cache_refs.
+@st.cache_resource(show_spinner=False)
+def _criar_armazenamento():
+    if ARMAZENAMENTO == "sqlite":
+        armazenamento = ArmazenamentoSQLite(CAMINHO_SQLITE)
+        # Na primeira execução, o banco recebe a tabela da pasta local (refs.parquet ou refs.csv e os deltas)
+        if os.path.isdir(DIRETORIO_LOCAL):
+            armazenamento.importar(ArmazenamentoLocal(DIRETORIO_LOCAL))
+        return armazenamento
+    if ARMAZENAMENTO == "local":
+        return ArmazenamentoLocal(DIRETORIO_LOCAL)
+    return ArmazenamentoDrive(_criar_servico_drive())
+
+# Cria o armazenamento configurado em REFS_ARMAZENAMENTO
+def obter_armazenamento():
+    if ARMAZENAMENTO == "drive" and authenticate_google_drive() is None:
+        return None
+    return _criar_armazenamento()
+
+# Carrega a tabela e monta os índices de busca em uma das threads compartilhadas,
+# deixando a cópia pronta para as sessões. Durante o carregamento são indexadas apenas as
+# colunas das buscas abertas nas sessões que aguardam a tabela; as partes lidas ficam em
+# estado["partes"] para que essas sessões já mostrem os primeiros resultados. Os demais
+# índices são montados depois que a tabela é entregue às sessões.
+def _aquecer_refs(estado):
+    def ao_carregar_parte(parte, normalizados):
+        estado["partes"].append((parte, normalizados))
+        estado["linhas_lidas"] = parte.index[-1] + 1 if len(parte) else 0
+
+    try:
+        armazenamento = _criar_armazenamento()
+        with estado["lock"]:
+            indexar = [coluna for coluna in COLUNAS_INDEXADAS if coluna in estado["colunas_busca"]]
+            estado["colunas_busca"].clear()
+        try:
+            refs = armazenamento.atualizar_cache(ao_carregar_parte=ao_carregar_parte, indexar=indexar)
+        finally:
+            estado["partes"] = []
+        if refs is not None:
+            revisao = revisao_tabela(refs)
+            for coluna in COLUNAS_INDEXADAS:
+                indice_busca(refs, coluna, revisao)
+            indice_urls(refs)
+            matriz_semelhanca(refs, revisao)
+        estado["atualizado_em"] = time.monotonic()
+    except Exception:
+        logging.getLogger(__name__).exception("Erro ao carregar a tabela de referências em segundo plano")
+
+# Agenda um carregamento em segundo plano, se ainda não houver um em andamento
+def agendar_carregamento(estado):
+    with estado["lock"]:
+        if estado["tarefa"] is None or estado["tarefa"].done():
+            estado["linhas_lidas"] = 0
+            estado["partes"] = []
+            estado["tarefa"] = estado["executor"].submit(_aquecer_refs, estado)
+        return estado["tarefa"]
+
+# Laço da thread de atualização: verifica periodicamente se o armazenamento mudou
+def _atualizar_periodicamente(estado):
+    while _carregador_refs() is estado:
+        agendar_carregamento(estado)
+        time.sleep(INTERVALO_ATUALIZACAO)
+
+# Carregador compartilhado por todas as sessões: começa a aquecer o cliente do Drive, a tabela
+# e os índices assim que o servidor sobe, e os mantém atualizados enquanto o app está no ar
+@st.cache_resource(show_spinner=False)
+def _carregador_refs():
+    estado = {
+        "executor": ThreadPoolExecutor(max_workers=THREADS_CARREGAMENTO, thread_name_prefix="carregar-refs"),
+        "lock": threading.Lock(), "tarefa": None, "atualizado_em": 0.0, "linhas_lidas": 0,
+        "partes": [], "colunas_busca": set(),  # Partes já lidas e colunas buscadas pelas sessões que aguardam
+    }
+    threading.Thread(target=_atualizar_periodicamente, args=(estado,), name="atualizar-refs", daemon=True).start()
+    return estado
+
+# Carrega a tabela de referências do armazenamento configurado. Enquanto uma tabela grande
+# chega em partes, mostra o progresso e já responde à busca da sessão com as linhas lidas.
+def carregar_refs(armazenamento):
+    # Com a cópia já aquecida, a tela é montada na hora; as mudanças no armazenamento
+    # chegam pela atualização em segundo plano
+    cache = _cache_refs()
+    with cache["lock"]:
+        refs = cache["df"]
+    if refs is not None:
+        estado = _carregador_refs()
+        if time.monotonic() - estado["atualizado_em"] > INTERVALO_ATUALIZACAO:
+            agendar_carregamento(estado)
+        return refs
+
+    aviso = st.empty()
+    busca = st.session_state.get("busca_atual")
+    encontradas = {"total": 0, "titulos": []}
+    # Os índices da busca aberta na sessão são montados junto com o carregamento
+    indexar = () if not busca else list(PESOS_BM25) if busca[0] == BUSCA_GERAL else [busca[0]]
+
+    def ao_carregar_parte(parte, normalizados):
+        lidas = parte.index[-1] + 1 if len(parte) else 0
+        if not busca or busca[0] not in parte:
+            aviso.info(f"Carregando referências... {lidas} linhas lidas.")
+            return
+        coluna, termo, case_sensitive = busca
+        if case_sensitive:
+            mascara = parte[coluna].astype("string").fillna("").str.contains(termo, regex=False)
+        else:
+            normalizado = normalizados[coluna] if coluna in normalizados else _normalizar_arrow(parte[coluna])
+            mascara = pc.match_substring(normalizado, normalizar_texto(termo))
+        mascara = np.asarray(mascara, dtype=bool)
+        encontradas["total"] += int(mascara.sum())
+        if "TITULO" in parte:
+            faltam = RESULTADOS_POR_PAGINA - len(encontradas["titulos"])
+            encontradas["titulos"].extend(parte.loc[mascara, "TITULO"].head(faltam).astype(object).fillna(""))
+        with aviso.container():
+            st.info(f"Carregando referências... {lidas} linhas lidas, {encontradas['total']} resultado(s) para '{termo}' até agora.")
+            for titulo in encontradas["titulos"]:
+                st.write(f"- {titulo}")
+
+    # Se o carregamento em segundo plano já começou, acompanha as partes que ele lê (respondendo
+    # à busca da sessão) até a tabela ser entregue; os demais índices continuam sendo montados
+    # em segundo plano
+    estado = _carregador_refs()
+    with estado["lock"]:
+        estado["colunas_busca"].update(indexar)
+        tarefa = estado["tarefa"]
+    vistas = 0
+    while tarefa is not None and not tarefa.done():
+        with cache["lock"]:
+            refs = cache["df"]
+        if refs is not None:
+            aviso.empty()
+            return refs
+        partes = estado["partes"][vistas:]
+        for parte, normalizados in partes:
+            ao_carregar_parte(parte, normalizados)
+        vistas += len(partes)
+        if not vistas:
+            aviso.info(f"Carregando referências... {estado['linhas_lidas']} linhas lidas.")
+        time.sleep(0.2)
+
+    try:
+        refs = armazenamento.atualizar_cache(ao_carregar_parte=ao_carregar_parte, indexar=indexar)
+        aviso.empty()
+        if refs is None:
             st.warning(f"Arquivo '{FILE_NAME}' não encontrado na pasta.")
             return pd.DataFrame()  # Retorna um DataFrame vazio se o arquivo não existir
+        return refs
     except Exception as e:
-        st.error(f"Erro ao baixar o CSV do Google Drive: {e}")
+        st.error(f"Erro ao carregar as referências ({armazenamento.nome}): {e}")
         return pd.DataFrame()  # Retorna um DataFrame vazio em caso de erro
 
-# Função para fazer upload do CSV para o Google Drive
-def upload_csv(service, df):
+# Laço da thread de escrita: agrupa as alterações que chegam juntas e grava cada grupo de uma vez
+def _processar_fila_escrita(fila):
+    while True:
+        lote = [fila.get()]
+        prazo = time.monotonic() + JANELA_LOTE_ESCRITA
+        while True:
+            restante = prazo - time.monotonic()
+            if restante <= 0:
+                break
+            try:
+                lote.append(fila.get(timeout=restante))
+            except queue.Empty:
+                break
+
+        armazenamento = lote[0]["armazenamento"]
+        chave = uuid.uuid4().hex[:12]  # A mesma em todas as tentativas (ver gravar_lote)
+        erro = None
+        precisa_compactar = False
+        for tentativa in range(TENTATIVAS_ESCRITA):
+            try:
+                precisa_compactar = armazenamento.gravar_lote([item["alteracao"] for item in lote], chave)
+                erro = None
+                break
+            except Exception as e:
+                erro = e
+                time.sleep(0.5 * (tentativa + 1))
+        if erro is not None:
+            _invalidar_cache_refs()
+        for item in lote:
+            item["erro"] = erro
+            item["evento"].set()
+
+        if precisa_compactar:
+            try:
+                armazenamento.compactar()
+            except Exception:
+                # A compactação é tentada de novo após o próximo lote
+                logging.getLogger(__name__).exception("Erro ao compactar a tabela de referências")
+
+# Coordenador de escrita compartilhado: uma única thread grava as alterações de todas as sessões
+@st.cache_resource(show_spinner=False)
+def _coordenador_escrita():
+    fila = queue.Queue()
+    threading.Thread(target=_processar_fila_escrita, args=(fila,), name="escrita-refs", daemon=True).start()
+    return {"fila": fila}
+
+# Salva uma alteração por meio do coordenador de escrita, sem reenviar a tabela inteira.
+# Retorna a tabela com a alteração aplicada (ou a tabela recebida, se não foi possível salvar).
+def salvar_alteracao(armazenamento, refs, alteracao):
+    item = {"armazenamento": armazenamento, "alteracao": alteracao, "evento": threading.Event(), "erro": None}
+    _coordenador_escrita()["fila"].put(item)
+
+    with medir_etapa("gravacao"):
+        confirmada = item["evento"].wait(TEMPO_LIMITE_ESCRITA)
+    if not confirmada:
+        st.error(f"O armazenamento ({armazenamento.nome}) demorou a responder. A alteração continua na fila e será salva em instantes.")
+        return refs
+    if item["erro"] is not None:
+        st.error(f"Erro ao salvar a alteração ({armazenamento.nome}): {item['erro']}")
+        return refs
+
+    cache = _cache_refs()
+    with cache["lock"]:
+        if cache["df"] is not None:
+            return cache["df"]
+    return carregar_refs(armazenamento)
+
+# Forma canônica dos campos de um conjunto de registros: textos sem espaços nas pontas e
+# palavras-chave separadas por ", " (aceitando vírgulas, ponto e vírgula ou espaços repetidos)
+def normalizar_registros(registros):
+    registros = registros.reindex(columns=COLUNAS_REFS).astype("string").fillna("")
+    registros = registros.apply(lambda coluna: coluna.str.strip())
+    registros["PALAVRAS_CHAVES"] = (
+        registros["PALAVRAS_CHAVES"]
+        .str.replace(r"\s*[,;]+\s*", ", ", regex=True)
+        .str.replace(r"\s+", " ", regex=True)
+        .str.strip(", ")
+    )
+    return registros
+
+# Parâmetros de rastreamento ignorados na comparação de links
+_PARAMETROS_RASTREAMENTO = r"(?:utm_[^=&]*|fbclid|gclid|igshid|si)"
+
+# Chave canônica dos links de uma coluna, usada para encontrar links repetidos: sem protocolo,
+# "www.", fragmento, parâmetros de rastreamento e barra final, com o domínio em minúsculas.
+# As expressões evitam lookarounds para rodar no motor de regex do Arrow, sem passar por objetos Python.
+def chave_url(serie):
+    serie = serie.astype("string[pyarrow]").fillna("").str.strip()
+    serie = serie.str.replace(r"#.*$", "", regex=True)
+    serie = serie.str.replace(r"^(?:[a-zA-Z][a-zA-Z0-9+.-]*:)?//", "", regex=True)
+    serie = serie.str.replace(rf"([?&]){_PARAMETROS_RASTREAMENTO}=[^&]*", r"\1", regex=True)
+    serie = serie.str.replace(r"\?&+", "?", regex=True).str.replace(r"&&+", "&", regex=True).str.replace(r"[?&]+$", "", regex=True)
+    serie = serie.str.replace(r"/+(\?|$)", r"\1", regex=True)
+    dominio = serie.str.replace(r"[/?].*$", "", regex=True).str.lower().str.replace(r"^www\.", "", regex=True)
+    return (dominio + serie.str.replace(r"^[^/?]*", "", regex=True)).astype("string")
+
+# Índice dos links cadastrados (chave canônica -> posições das linhas ativas), um por revisão
+# da tabela. É atualizado a partir do índice anterior, revendo apenas as linhas alteradas.
+# O dicionário é atualizado no lugar, como as posições dos IDs em _cache_refs.
+@st.cache_resource(max_entries=2, show_spinner=False)
+def _indice_urls(_df, revisao, total_linhas):
+    cache = _cache_refs()
+    with cache["lock_urls"]:
+        return _atualizar_indice_urls(cache, _caminhos_ativos(_df, total_linhas))
+
+# Índice de links da tabela recebida. O de uma tabela já substituída por outra sessão é montado
+# do zero, sem alterar o índice compartilhado.
+def indice_urls(refs):
+    revisao = revisao_tabela(refs)
+    if revisao is None:
+        return _atualizar_indice_urls({"urls": None}, _caminhos_ativos(refs, len(refs)))
+    return _indice_urls(refs, revisao, len(refs))
+
+# Links das linhas, com as excluídas vazias
+def _caminhos_ativos(df, total_linhas):
+    caminhos = df["CAMINHO"].astype("string").fillna("") if "CAMINHO" in df else pd.Series([""] * total_linhas, dtype="string")
+    return caminhos.mask(_excluidas(df), "").to_numpy(dtype=object)
+
+# Atualiza cache["urls"] para os links atuais (com cache["lock_urls"] adquirido)
+def _atualizar_indice_urls(cache, caminhos):
+    anterior = cache["urls"]
+    anteriores = anterior["caminhos"] if anterior else np.array([], dtype=object)
+    tamanho = max(len(caminhos), len(anteriores))
+
+    # Linhas excluídas ou removidas contam como links vazios
+    atuais = np.full(tamanho, "", dtype=object)
+    atuais[:len(caminhos)] = caminhos
+    antigos = np.full(tamanho, "", dtype=object)
+    antigos[:len(anteriores)] = anteriores
+    mudaram = np.flatnonzero(atuais != antigos)
+    if anterior and not len(mudaram):
+        return anterior
+
+    mapa = anterior["mapa"] if anterior else {}
+    chaves = np.full(tamanho, "", dtype=object)
+    if anterior:
+        chaves[:len(anteriores)] = anterior["chaves"]
+    chaves_novas = chave_url(pd.Series(atuais[mudaram], dtype="string")).to_numpy(dtype=object)
+    for posicao, antiga, nova in zip(mudaram.tolist(), chaves[mudaram], chaves_novas):
+        if antiga:
+            mapa[antiga].discard(posicao)
+            if not mapa[antiga]:
+                del mapa[antiga]
+        if nova:
+            mapa.setdefault(nova, set()).add(posicao)
+    chaves[mudaram] = chaves_novas
+
+    cache["urls"] = {"caminhos": caminhos, "chaves": chaves[:len(caminhos)], "mapa": mapa}
+    return cache["urls"]
+
+# Verifica de uma vez as regras de registro para todas as linhas (já normalizadas):
+# todos os campos preenchidos, de 3 a 5 palavras-chave e link ainda não cadastrado
+# (nem repetido entre as próprias linhas). A linha em "ignorar" (a que está sendo editada)
+# não conta como cadastro anterior. Retorna o motivo da rejeição de cada linha ("" para as válidas).
+def validar_registros(refs, registros, ignorar=None):
+    motivos = pd.Series("", index=registros.index, dtype=object)
+    chaves = chave_url(registros["CAMINHO"])
+    cadastrados = indice_urls(refs)["mapa"]
+    existentes = np.array([bool(cadastrados.get(chave, set()) - {ignorar}) for chave in chaves], dtype=bool)
+    motivos[chaves.duplicated().to_numpy()] = "Link repetido entre as referências informadas."
+    motivos[existentes] = "Este link já está cadastrado em outra referência."
+    quantidade_palavras = registros["PALAVRAS_CHAVES"].str.count(r"\S+")
+    motivos[(quantidade_palavras < 3) | (quantidade_palavras > 5)] = "O campo 'Palavras-Chave' deve conter de 3 a 5 palavras."
+    motivos[registros.eq("").any(axis=1)] = "Por favor, preencha todos os campos."
+    return motivos
+
+# Normaliza e valida um único registro dos formulários; retorna o registro normalizado e o
+# motivo da rejeição ("" se for válido)
+def validar_registro(refs, registro, ignorar=None):
+    registros = normalizar_registros(pd.DataFrame([registro]))
+    return registros.iloc[0].to_dict(), validar_registros(refs, registros, ignorar).iloc[0]
+
+# Lê as referências de um arquivo CSV/XLSX enviado ou de linhas coladas (separadas por
+# tabulação, vírgula ou ponto e vírgula). Sem cabeçalho, as colunas seguem a ordem de COLUNAS_REFS.
+def ler_importacao(arquivo=None, texto=""):
+    # As linhas são lidas sem cabeçalho; a primeira só é cabeçalho se tiver todas as colunas
+    if arquivo is not None and arquivo.name.lower().endswith(".xlsx"):
+        registros = pd.read_excel(arquivo, dtype=str, header=None)
+    else:
+        if arquivo is not None:
+            texto = arquivo.getvalue().decode("utf-8-sig")
+        # Linhas coladas de uma planilha vêm separadas por tabulação, e seus textos costumam ter
+        # vírgulas; sem tabulação, o separador é o mais frequente na primeira linha
+        separador = "\t" if "\t" in texto else max([";", ","], key=texto.lstrip().split("\n", 1)[0].count)
+        registros = pd.read_csv(io.StringIO(texto), dtype=str, sep=separador, header=None, skip_blank_lines=True)
+    if registros.empty:
+        return pd.DataFrame(columns=COLUNAS_REFS)
+    cabecalho = registros.iloc[0].astype(str).str.strip().str.upper()
+    if set(COLUNAS_REFS) <= set(cabecalho):
+        registros = registros.iloc[1:].set_axis(cabecalho, axis=1)
+    else:
+        registros = registros.iloc[:, :len(COLUNAS_REFS)]
+        registros.columns = COLUNAS_REFS[:registros.shape[1]]
+    return registros.reindex(columns=COLUNAS_REFS).reset_index(drop=True)
+
+# Separa as referências importadas, já normalizadas, entre as que podem ser registradas
+# e as rejeitadas (com o motivo)
+def preparar_importacao(refs, registros):
+    registros = normalizar_registros(registros)
+    motivos = validar_registros(refs, registros)
+    validos = motivos.eq("")
+    return registros.loc[validos], registros.loc[~validos].assign(MOTIVO=motivos[~validos])
+
+# Posições das linhas ativas cujo link repete o de uma linha anterior (a primeira é mantida)
+def links_duplicados(refs):
+    chaves = pd.Series(indice_urls(refs)["chaves"])
+    return np.flatnonzero((chaves.ne("") & chaves.duplicated()).to_numpy())
+
+# Remove as referências com links duplicados numa única alteração e compacta a tabela
+def deduplicar_refs(armazenamento, refs):
+    ids = refs[COLUNA_ID].iloc[links_duplicados(refs)].tolist()
+    if ids:
+        refs = salvar_alteracao(armazenamento, refs, {"op": "lote", "alteracoes": [{"op": "excluir", "id": i} for i in ids]})
     try:
-        # Verifica se o arquivo já existe na pasta
-        query = f"'{FOLDER_ID}' in parents and name = '{FILE_NAME}'"
-        response = service.files().list(q=query, fields="files(id)").execute()
-        files = response.get("files", [])
-
-        if files:
-            # Se o arquivo já existe, atualize-o
-            file_id = files[0]["id"]
-            csv_buffer = io.StringIO()
-            df.to_csv(csv_buffer, index=False)
-            media = MediaIoBaseUpload(io.BytesIO(csv_buffer.getvalue().encode()), mimetype="text/csv")
-            service.files().update(fileId=file_id, media_body=media).execute()
-        else:
-            # Se o arquivo não existe, crie-o
-            file_metadata = {
-                "name": FILE_NAME,
-                "parents": [FOLDER_ID],
-            }
-            csv_buffer = io.StringIO()
-            df.to_csv(csv_buffer, index=False)
-            media = MediaIoBaseUpload(io.BytesIO(csv_buffer.getvalue().encode()), mimetype="text/csv")
-            service.files().create(body=file_metadata, media_body=media, fields="id").execute()
+        armazenamento.compactar()
     except Exception as e:
-        st.error(f"Erro ao fazer upload do CSV para o Google Drive: {e}")
-        
-def main(service, refs):
+        st.error(f"Erro ao compactar as referências ({armazenamento.nome}): {e}")
+    cache = _cache_refs()
+    with cache["lock"]:
+        return cache["df"] if cache["df"] is not None else refs
+
+# Marcas de acentuação (diacríticos combinantes) separadas pela normalização NFKD
+_ACENTOS = "[\u0300-\u036f]"
+
+# Remove acentos e diferenças de maiúsculas/minúsculas para comparação de textos
+def normalizar_texto(texto):
+    return re.sub(_ACENTOS, "", unicodedata.normalize("NFKD", str(texto).casefold()))
+
+# Versão vetorizada de normalizar_texto para uma coluna inteira
+def normalizar_serie(serie):
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        # Em colunas categóricas basta normalizar cada categoria uma única vez
+        categorias = normalizar_serie(pd.Series(serie.cat.categories, dtype=object))
+        return pd.Series(np.append(categorias.to_numpy(dtype=object), "")[serie.cat.codes], index=serie.index)
+    serie = serie.astype("string").fillna("")
+    return serie.str.casefold().str.normalize("NFKD").str.replace(_ACENTOS, "", regex=True)
+
+# Separa um texto normalizado em palavras
+_tokenizar = re.compile(r"\w+").findall
+
+# O mesmo critério de _tokenizar nas expressões regulares do Arrow: qualquer caractere que não
+# seja letra, dígito ou "_" separa as palavras
+_SEPARADOR_PALAVRAS = r"[^\pL\pN_]+"
+
+# Textos de uma coluna como strings do Arrow (sem cópia quando a coluna já é do Arrow)
+def _texto_arrow(serie):
+    if isinstance(serie.array, pd.arrays.ArrowStringArray):
+        return serie.array.__arrow_array__()
+    return pa.chunked_array([pa.array(serie.to_numpy(dtype=object), type=pa.large_string(), from_pandas=True)])
+
+# Textos normalizados (normalizar_serie) de uma coluna como strings do Arrow
+def _normalizar_arrow(serie):
+    return pa.array(normalizar_serie(serie).to_numpy(dtype=object), type=pa.large_string())
+
+# Palavras dos textos normalizados, uma por ocorrência, com a posição (de "posicoes") da linha
+# em que ocorrem; as linhas ficam em ordem crescente
+def _tokenizar_textos(normalizados, posicoes):
+    if isinstance(normalizados, pa.ChunkedArray):
+        normalizados = normalizados.combine_chunks()
+    partes = pc.split_pattern_regex(normalizados, _SEPARADOR_PALAVRAS)
+    palavras = pc.list_flatten(partes)
+    linhas = np.asarray(posicoes, dtype=np.int32)[pc.list_parent_indices(partes).to_numpy()]
+    validas = pc.not_equal(palavras, "")
+    return palavras.filter(validas), linhas[validas.to_numpy(zero_copy_only=False)]
+
+# Agrupa as ocorrências por palavra com uma única ordenação estável. Retorna o vocabulário, os
+# limites de cada palavra e, em ordem de palavra e linha, as linhas (sem repetição) e quantas
+# vezes a palavra aparece em cada uma
+def _agrupar_palavras(palavras, linhas):
+    codificadas = pc.dictionary_encode(palavras)
+    vocabulario = codificadas.dictionary.to_pylist()
+    codigos = codificadas.indices.to_numpy()
+    ordem = np.argsort(codigos, kind="stable")  # As linhas já chegam em ordem crescente
+    codigos, linhas = codigos[ordem], linhas[ordem]
+    inicios = np.flatnonzero((np.diff(codigos, prepend=-1) != 0) | (np.diff(linhas, prepend=-1) != 0))
+    quantidades = np.diff(np.append(inicios, len(codigos))).astype(np.float32)
+    codigos, linhas = codigos[inicios], linhas[inicios]
+    limites = np.searchsorted(codigos, np.arange(len(vocabulario) + 1))
+    return vocabulario, limites, linhas, quantidades
+
+# Monta o índice a partir dos textos da coluna, dos textos normalizados e das ocorrências das
+# palavras de todas as linhas
+def _montar_indice(textos, textos_normalizados, palavras, linhas):
+    comprimentos = np.bincount(linhas, minlength=len(textos)).astype(np.float32)
+    vocabulario, limites, linhas, quantidades = _agrupar_palavras(palavras, linhas)
+    return _completar_vocabulario({
+        "textos": textos,
+        "textos_normalizados": textos_normalizados,
+        "postings": {token: linhas[limites[j]:limites[j + 1]] for j, token in enumerate(vocabulario)},
+        "frequencias": {token: quantidades[limites[j]:limites[j + 1]] for j, token in enumerate(vocabulario)},
+        "comprimentos": comprimentos,
+    })
+
+# Guarda no índice o vocabulário como strings do Arrow, para procurar as palavras que contêm
+# um trecho numa única operação vetorizada, com as listas de linhas na mesma ordem
+def _completar_vocabulario(indice):
+    indice["vocabulario"] = pa.array(list(indice["postings"]), type=pa.large_string())
+    indice["listas"] = list(indice["postings"].values())
+    indice["documentos"] = np.fromiter(map(len, indice["listas"]), dtype=np.int64, count=len(indice["listas"]))
+    return indice
+
+# Índice de uma coluna inteira, montado do zero
+def _construir_indice(serie):
+    normalizados = _normalizar_arrow(serie)
+    return _montar_indice(
+        _texto_arrow(serie), pa.chunked_array([normalizados]), *_tokenizar_textos(normalizados, np.arange(len(serie)))
+    )
+
+# Dois trechos do Arrow com os mesmos buffers e o mesmo deslocamento têm o mesmo conteúdo
+def _mesmo_trecho(a, b):
+    enderecos = lambda trecho: [buffer.address if buffer else None for buffer in trecho.buffers()]
+    return a.type == b.type and a.offset == b.offset and len(a) == len(b) and enderecos(a) == enderecos(b)
+
+# Posições em que o texto atual difere do anterior, incluindo as linhas novas. Os trechos
+# compartilhados pelas duas versões (as edições copiam só os trechos que alteram) não são comparados.
+def _linhas_alteradas(anterior, atual):
+    comum = len(anterior)
+    alteradas = []
+    inicio = 0
+    for trecho in atual.chunks:
+        tamanho = min(len(trecho), comum - inicio)
+        if tamanho > 0:
+            novo = trecho.slice(0, tamanho)
+            antigo = anterior.slice(inicio, tamanho)
+            if not (antigo.num_chunks == 1 and _mesmo_trecho(antigo.chunk(0), novo)):
+                diferentes = pc.not_equal(antigo.combine_chunks().fill_null(""), novo.fill_null("").cast(antigo.type))
+                alteradas.append(inicio + np.flatnonzero(diferentes.to_numpy(zero_copy_only=False)))
+        inicio += len(trecho)
+    alteradas.append(np.arange(comum, len(atual)))
+    return np.concatenate(alteradas)
+
+# Linhas (e frequências) de uma palavra sem as posições em "remover" e com as em "incluir";
+# todas as listas em ordem crescente
+def _substituir_ocorrencias(linhas, quantidades, remover, incluir, quantidades_incluidas):
+    i = np.searchsorted(linhas, remover)
+    presentes = i < len(linhas)
+    presentes[presentes] = linhas[i[presentes]] == remover[presentes]
+    linhas, quantidades = np.delete(linhas, i[presentes]), np.delete(quantidades, i[presentes])
+    j = np.searchsorted(linhas, incluir)
+    return np.insert(linhas, j, incluir), np.insert(quantidades, j, quantidades_incluidas)
+
+# Atualiza o índice "anterior" para o conteúdo atual da coluna. Só as linhas cujo texto mudou
+# (ou que são novas) são tokenizadas, e só as listas das palavras que elas tinham ou passaram a
+# ter são refeitas; as demais são compartilhadas com o índice anterior. Sem índice anterior, com
+# linhas removidas (compactação) ou com muitas linhas alteradas, o índice é montado do zero.
+def _atualizar_indice(anterior, serie):
+    if anterior is None or len(serie) < len(anterior["textos"]):
+        return _construir_indice(serie)
+    textos = _texto_arrow(serie)
+    mudaram = _linhas_alteradas(anterior["textos"], textos)
+    if not len(mudaram):
+        return anterior
+    if len(mudaram) > len(serie) // 4:
+        return _construir_indice(serie)
+
+    comum = len(anterior["textos"])
+    antigas = mudaram[mudaram < comum]
+    normalizados = _normalizar_arrow(serie.iloc[mudaram])
+    removidas, _ = _tokenizar_textos(anterior["textos_normalizados"].take(antigas), antigas)
+    palavras, linhas = _tokenizar_textos(normalizados, mudaram)
+    comprimentos = np.zeros(len(serie), dtype=np.float32)
+    comprimentos[:comum] = anterior["comprimentos"]
+    comprimentos[mudaram] = np.bincount(np.searchsorted(mudaram, linhas), minlength=len(mudaram))
+
+    vocabulario, limites, linhas, quantidades = _agrupar_palavras(palavras, linhas)
+    novas = {token: j for j, token in enumerate(vocabulario)}
+    postings, frequencias = dict(anterior["postings"]), dict(anterior["frequencias"])
+    vazio = (np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32))
+    for token in set(removidas.unique().to_pylist()) | novas.keys():
+        j = novas.get(token)
+        incluir = slice(limites[j], limites[j + 1]) if j is not None else slice(0, 0)
+        linhas_token, quantidades_token = _substituir_ocorrencias(
+            postings.get(token, vazio[0]), frequencias.get(token, vazio[1]), antigas, linhas[incluir], quantidades[incluir]
+        )
+        if len(linhas_token):
+            postings[token], frequencias[token] = linhas_token, quantidades_token
+        else:
+            del postings[token], frequencias[token]
+
+    textos_normalizados = _substituir_trechos(anterior["textos_normalizados"], antigas, normalizados.slice(0, len(antigas)))
+    if len(serie) > comum:
+        textos_normalizados = pa.chunked_array(textos_normalizados.chunks + [normalizados.slice(len(antigas))])
+    return _completar_vocabulario({
+        "textos": textos,
+        "textos_normalizados": textos_normalizados,
+        "postings": postings,
+        "frequencias": frequencias,
+        "comprimentos": comprimentos,
+    })
+
+# Indexação de uma coluna em partes, usada enquanto a tabela é carregada
+def _nova_indexacao():
+    return {"textos_normalizados": [], "palavras": [], "linhas": []}
+
+# Indexa as linhas de uma parte da coluna (a partir da posição "inicio") e retorna seus textos normalizados
+def _indexar_parte(indexacao, serie, inicio):
+    normalizados = _normalizar_arrow(serie)
+    palavras, linhas = _tokenizar_textos(normalizados, np.arange(inicio, inicio + len(serie)))
+    indexacao["textos_normalizados"].append(normalizados)
+    indexacao["palavras"].append(palavras)
+    indexacao["linhas"].append(linhas)
+    return normalizados
+
+# Conclui a indexação da coluna, já com a série da tabela montada
+def _concluir_indexacao(indexacao, serie):
+    if not indexacao["palavras"]:
+        return _construir_indice(serie)
+    return _montar_indice(
+        _texto_arrow(serie),
+        pa.chunked_array(indexacao["textos_normalizados"]),
+        pa.concat_arrays(indexacao["palavras"]),
+        np.concatenate(indexacao["linhas"]),
+    )
+
+# Índice invertido (palavra -> linhas) de uma coluna, um por revisão da tabela. É atualizado
+# a partir do último índice da coluna (montado no carregamento ou numa revisão anterior).
+# Guarda também a frequência de cada palavra por linha e o tamanho dos textos, usados no BM25.
+@st.cache_resource(max_entries=8, show_spinner=False)
+def _indice_busca(_df, coluna, revisao, total_linhas):
+    indice = _indice_atualizado(_df, coluna, total_linhas)
+    cache = _cache_refs()
+    with cache["lock"]:
+        if cache["df"] is _df:
+            cache["indices"][coluna] = indice
+    return indice
+
+# Índice da coluna para a tabela recebida, atualizado a partir do último índice da coluna
+def _indice_atualizado(df, coluna, total_linhas):
+    serie = df[coluna] if coluna in df else pd.Series([""] * total_linhas)
+    cache = _cache_refs()
+    with cache["lock"]:
+        anterior = cache["indices"].get(coluna)
+    return _atualizar_indice(anterior, serie)
+
+# Índice de busca da coluna na tabela de revisão "revisao" (ver revisao_tabela). O de uma
+# tabela já substituída é montado sem ser guardado.
+def indice_busca(df, coluna, revisao):
+    if revisao is None:
+        return _indice_atualizado(df, coluna, len(df))
+    return _indice_busca(df, coluna, revisao, len(df))
+
+# Posições (dentre "candidatas") das linhas cujo texto contém o termo. Com muitas candidatas, a
+# coluna inteira é conferida numa única varredura, em vez de copiar os textos das candidatas.
+# A expressão regular (RE2) de um literal percorre os textos bem mais rápido que match_substring.
+def _confirmar_trecho(textos, termo, candidatas):
+    padrao = re.escape(termo)
+    if len(candidatas) > FRACAO_VARREDURA * len(textos):
+        contem = np.asarray(pc.match_substring_regex(textos, padrao).fill_null(False))
+        return candidatas[contem[candidatas]]
+    contem = np.asarray(pc.match_substring_regex(textos.take(candidatas), padrao).fill_null(False))
+    return candidatas[contem]
+
+# Retorna as posições (em ordem) das linhas cuja coluna contém o termo
+# (se "candidatas" for informado, apenas essas linhas são verificadas)
+def buscar_posicoes(df, coluna, termo, case_sensitive=False, candidatas=None):
+    indice = indice_busca(df, coluna, revisao_tabela(df))
+    termo_normalizado = normalizar_texto(termo)
+    confirmar = case_sensitive or _tokenizar(termo_normalizado) != [termo_normalizado]
+
+    # Candidatas: linhas que têm, para cada palavra do termo, alguma palavra que a contém. Quando
+    # as listas dessas palavras somam mais entradas que a tabela tem linhas, elas restringem pouco
+    # e custariam mais para unir que a varredura dos textos, que passa a confirmar o termo.
+    if candidatas is None:
+        selecionadas = ~_excluidas(df)  # Ignora as linhas excluídas
+        for token_busca in set(_tokenizar(termo_normalizado)):
+            palavras = np.flatnonzero(np.asarray(pc.match_substring(indice["vocabulario"], token_busca)))
+            if not len(palavras):
+                return np.array([], dtype=np.int32)
+            if indice["documentos"][palavras].sum() > len(df):
+                confirmar = True
+                continue
+            contem = np.zeros(len(df), dtype=bool)
+            contem[np.concatenate([indice["listas"][j] for j in palavras])] = True
+            selecionadas &= contem
+        candidatas = np.flatnonzero(selecionadas).astype(np.int32)
+        # Quando o termo é uma única palavra, o índice já garante a ocorrência
+        if not confirmar:
+            return candidatas
+
+    # Confirma a ocorrência do termo como substring nas linhas candidatas
+    if case_sensitive:
+        return _confirmar_trecho(indice["textos"], termo, candidatas)
+    return _confirmar_trecho(indice["textos_normalizados"], termo_normalizado, candidatas)
+
+# Busca ranqueada (BM25) em todos os campos, retornando as k linhas mais relevantes
+def buscar_ranqueado(df, termo, k=TOP_K_BUSCA):
+    revisao = revisao_tabela(df)
+    pontuacao = np.zeros(len(df), dtype=np.float32)
+
+    for coluna, peso in PESOS_BM25.items():
+        indice = indice_busca(df, coluna, revisao)
+        comprimentos = indice["comprimentos"]
+        media_comprimento = max(float(comprimentos.mean()), 1.0) if len(comprimentos) else 1.0
+        normalizacao = BM25_K1 * (1 - BM25_B + BM25_B * comprimentos / media_comprimento)
+
+        for token_busca in set(_tokenizar(normalizar_texto(termo))):
+            # Palavras exatas; sem correspondência exata, aceita palavras que começam com o termo
+            tokens = [token_busca] if token_busca in indice["postings"] else indice["vocabulario"].filter(
+                pc.starts_with(indice["vocabulario"], token_busca)
+            ).to_pylist()
+            for token in tokens:
+                linhas = indice["postings"][token]
+                tf = indice["frequencias"][token]
+                idf = np.log(1 + (len(df) - len(linhas) + 0.5) / (len(linhas) + 0.5))
+                # Cada linha aparece uma única vez na lista, então a soma indexada é segura
+                pontuacao[linhas] += peso * idf * tf * (BM25_K1 + 1) / (tf + normalizacao[linhas])
+
+    pontuacao[_excluidas(df)] = 0  # Ignora as linhas excluídas
+    relevantes = np.flatnonzero(pontuacao > 0)
+    if len(relevantes) > k:
+        relevantes = relevantes[np.argpartition(-pontuacao[relevantes], k - 1)[:k]]
+    return relevantes[np.argsort(-pontuacao[relevantes], kind="stable")]
+
+# Matriz TF-IDF das descrições, uma por revisão da tabela, montada a partir do índice invertido
+# da coluna (que já é atualizado apenas nas linhas alteradas); os pesos são recalculados numa
+# única passada vetorizada. As linhas têm norma 1, então o cosseno é o produto escalar.
+@st.cache_resource(max_entries=2, show_spinner=False)
+def _matriz_semelhanca(_df, revisao, total_linhas):
+    return _montar_matriz(_indice_busca(_df, COLUNA_SEMELHANCA, revisao, total_linhas), total_linhas)
+
+# Matriz de semelhança da tabela de revisão "revisao"; a de uma tabela já substituída não é guardada
+def matriz_semelhanca(df, revisao):
+    if revisao is None:
+        return _montar_matriz(indice_busca(df, COLUNA_SEMELHANCA, None), len(df))
+    return _matriz_semelhanca(df, revisao, len(df))
+
+# Matriz TF-IDF a partir do índice invertido das descrições
+def _montar_matriz(indice, total_linhas):
+    postings = indice["postings"]
+    documentos = indice["documentos"]
+    limites = np.concatenate([[0], np.cumsum(documentos)])
+    linhas = np.concatenate([np.zeros(0, dtype=np.int32), *indice["listas"]])
+    quantidades = np.concatenate([np.zeros(0, dtype=np.float32), *indice["frequencias"].values()])
+    idf = (np.log((1 + total_linhas) / (1 + documentos)) + 1).astype(np.float32)
+    pesos = (1 + np.log(quantidades)) * np.repeat(idf, documentos)
+    normas = np.sqrt(np.bincount(linhas, weights=pesos ** 2, minlength=total_linhas))
+    return {
+        "termos": {token: j for j, token in enumerate(postings)},
+        "idf": idf,
+        "limites": limites,
+        "linhas": linhas,
+        "pesos": (pesos / normas[linhas]).astype(np.float32),
+        "textos_normalizados": indice["textos_normalizados"],
+    }
+
+# Cosseno entre um texto normalizado e todas as linhas: percorre apenas as entradas das
+# palavras do texto, reunidas numa única indexação
+def _cossenos(matriz, texto_normalizado, total_linhas):
+    contagem = Counter(token for token in _tokenizar(texto_normalizado) if token in matriz["termos"])
+    if not contagem:
+        return np.zeros(total_linhas)
+    termos = np.array([matriz["termos"][token] for token in contagem], dtype=np.int32)
+    pesos = (1 + np.log(np.array(list(contagem.values()), dtype=np.float32))) * matriz["idf"][termos]
+
+    inicios = matriz["limites"][termos]
+    tamanhos = matriz["limites"][termos + 1] - inicios
+    entradas = np.repeat(inicios - np.cumsum(tamanhos) + tamanhos, tamanhos) + np.arange(tamanhos.sum())
+    return np.bincount(
+        matriz["linhas"][entradas], weights=matriz["pesos"][entradas] * np.repeat(pesos, tamanhos), minlength=total_linhas
+    )
+
+# As k linhas ativas de maior pontuação, em ordem decrescente
+def _mais_semelhantes(df, pontuacao, k, ignorar=None):
+    pontuacao[_excluidas(df)] = 0  # Ignora as linhas excluídas
+    if ignorar is not None:
+        pontuacao[ignorar] = 0
+    relevantes = np.flatnonzero(pontuacao > 0)
+    if len(relevantes) > k:
+        relevantes = relevantes[np.argpartition(-pontuacao[relevantes], k - 1)[:k]]
+    return relevantes[np.argsort(-pontuacao[relevantes], kind="stable")]
+
+# Retorna as posições das k referências cuja descrição mais se parece com o texto
+def buscar_semelhantes(df, texto, k=TOP_K_SEMELHANTES):
+    matriz = matriz_semelhanca(df, revisao_tabela(df))
+    return _mais_semelhantes(df, _cossenos(matriz, normalizar_texto(texto), len(df)), k)
+
+# Retorna as posições das k referências mais parecidas com a referência do ID informado
+def semelhantes_a(df, id_referencia, k=TOP_K_SEMELHANTES):
+    posicao = posicao_referencia(df, id_referencia)
+    if posicao is None:
+        return np.array([], dtype=np.int64)
+    matriz = matriz_semelhanca(df, revisao_tabela(df))
+    pontuacao = _cossenos(matriz, matriz["textos_normalizados"][posicao].as_py(), len(df))
+    return _mais_semelhantes(df, pontuacao, k, ignorar=posicao)
+
+# Manutenção da tabela (apenas para administradores): remove as referências com links
+# duplicados e compacta o arquivo
+def exibir_manutencao(armazenamento, refs):
+    st.subheader("Manutenção")
+    if "duplicadas_removidas" in st.session_state:
+        st.success(f"{st.session_state.pop('duplicadas_removidas')} referência(s) duplicada(s) removida(s).")
+    duplicados = links_duplicados(refs)
+    st.write(f"{len(duplicados)} referência(s) repetem o link de outra referência já cadastrada.")
+    if st.button("Remover duplicadas e compactar"):
+        refs = deduplicar_refs(armazenamento, refs)
+        st.session_state.duplicadas_removidas = len(duplicados)
+        st.rerun()
+    return refs
+
+# Aba de desempenho (apenas para administradores): histogramas das etapas, execuções mais
+# lentas e exportação das métricas no formato do Prometheus
+def exibir_painel_desempenho():
+    st.header("Desempenho do App")
+    metricas = _metricas()
+    with metricas["lock"]:
+        etapas = {nome: np.array(etapa["duracoes"]) * 1000 for nome, etapa in sorted(metricas["etapas"].items())}
+        totais = {nome: (etapa["contagem"], etapa["linhas"], etapa["bytes"]) for nome, etapa in metricas["etapas"].items()}
+        execucoes = list(metricas["execucoes"])
+
+    if not etapas:
+        st.info("Nenhuma medição registrada ainda.")
+        return
+
+    st.subheader("Etapas")
+    st.caption(f"Percentis das últimas {LIMITE_MEDICOES} medições de cada etapa; totais desde o início do servidor.")
+    st.dataframe(pd.DataFrame([
+        {
+            "Etapa": nome, "Medições": totais[nome][0],
+            "p50 (ms)": np.percentile(duracoes, 50), "p95 (ms)": np.percentile(duracoes, 95),
+            "Máximo (ms)": duracoes.max(), "Linhas": totais[nome][1], "Bytes": totais[nome][2],
+        }
+        for nome, duracoes in etapas.items()
+    ]).round(1), hide_index=True, use_container_width=True)
+
+    etapa = st.selectbox("Histograma da etapa:", list(etapas), index=list(etapas).index("execucao") if "execucao" in etapas else 0)
+    contagens, bordas = np.histogram(etapas[etapa], bins=min(20, max(1, len(etapas[etapa]))))
+    st.bar_chart(pd.DataFrame({"Medições": contagens}, index=[f"{borda:.1f} ms" for borda in bordas[:-1]]))
+
+    st.subheader("Execuções mais lentas")
+    mais_lentas = sorted(execucoes, key=lambda execucao: execucao["duracao"], reverse=True)[:10]
+    st.dataframe(pd.DataFrame([
+        {
+            "Horário": time.strftime("%d/%m %H:%M:%S", time.localtime(execucao["horario"])),
+            "Duração (ms)": round(execucao["duracao"] * 1000, 1),
+            "Etapas": ", ".join(
+                f"{item['etapa']} {item['duracao'] * 1000:.0f} ms"
+                for item in sorted(execucao["etapas"], key=lambda item: item["duracao"], reverse=True)
+            ),
+        }
+        for execucao in mais_lentas
+    ]), hide_index=True, use_container_width=True)
+
+    st.subheader("Prometheus")
+    st.caption(f"As métricas são gravadas em '{ARQUIVO_METRICAS}' a cada {INTERVALO_EXPORTACAO} segundos.")
+    st.download_button("Baixar métricas", data=metricas_prometheus(), file_name=os.path.basename(ARQUIVO_METRICAS), mime="text/plain")
+
+def main(armazenamento, refs):
     # Função para buscar termos contidos no texto
     def buscar_termo(df, coluna, termo, case_sensitive=False):
         """
@@ -122,11 +1922,47 @@ def main(service, refs):
             coluna (str): A coluna onde o termo será buscado.
             termo (str): O termo a ser buscado.
             case_sensitive (bool): Se a busca deve ser sensível a maiúsculas/minúsculas.
+                Quando False, acentos também são ignorados.
         
         Retorna:
-            pd.DataFrame: Um DataFrame com as linhas que contêm o termo.
+            np.ndarray: As posições das linhas que contêm o termo. Na busca em todos os
+            campos (BUSCA_GERAL), as das linhas mais relevantes, em ordem de relevância.
         """
-        return df[df[coluna].str.contains(termo, case=case_sensitive, na=False)]
+        # Cache da sessão (LRU): (coluna, termo, case_sensitive, revisão) -> posições das linhas.
+        # Os resultados de uma tabela já substituída (revisão None) não entram no cache.
+        if "cache_buscas" not in st.session_state:
+            st.session_state.cache_buscas = OrderedDict()
+        cache = st.session_state.cache_buscas
+        revisao = revisao_tabela(df)
+        chave = (coluna, termo, case_sensitive, revisao)
+        if chave in cache:
+            cache.move_to_end(chave)
+            return cache[chave]
+
+        with medir_etapa("busca") as medida:
+            if coluna == BUSCA_GERAL:
+                posicoes = buscar_ranqueado(df, termo)
+            elif coluna == BUSCA_SEMELHANTES:
+                posicoes = buscar_semelhantes(df, termo)
+            elif coluna == SEMELHANTES_A:
+                posicoes = semelhantes_a(df, termo)
+            else:
+                # Se o termo estende uma busca anterior ("corr" -> "corrida"), basta filtrar
+                # os resultados dela em vez da tabela inteira
+                comparar = (lambda texto: texto) if case_sensitive else normalizar_texto
+                anteriores = [
+                    posicoes for (c, t, cs, r), posicoes in cache.items()
+                    if c == coluna and cs == case_sensitive and r == revisao and comparar(t) in comparar(termo)
+                ]
+                candidatas = min(anteriores, key=len) if anteriores else None
+                posicoes = armazenamento.buscar(df, coluna, termo, case_sensitive=case_sensitive, candidatas=candidatas)
+            medida["linhas"] = len(posicoes)
+
+        if revisao is not None:
+            cache[chave] = posicoes
+            while len(cache) > LIMITE_CACHE_BUSCAS:
+                cache.popitem(last=False)
+        return posicoes
         
         
     col1, col2, col3 = st.columns([1, 4, 1])  # A primeira coluna ocupa 4 partes, a segunda 1 parte
@@ -142,10 +1978,15 @@ def main(service, refs):
     with col3:
         if st.button("Logout"):
             st.session_state.usuario_autenticado = False
+            st.session_state.usuario = None
             st.rerun()
 
-    # Criando abas
-    tab1, tab2, tab3 = st.tabs(["Como funciona?", "Busca de Referência", "Registro de Referência"])
+    # Criando abas (a de desempenho apenas para administradores)
+    abas = ["Como funciona?", "Busca de Referência", "Registro de Referência"]
+    admin = st.session_state.get("usuario") in USUARIOS_ADMIN
+    if admin:
+        abas.append("Desempenho")
+    tab1, tab2, tab3, *tab_desempenho = st.tabs(abas)
 
     with tab1:
         st.header("Funcionamento da Busca de Referências:")
@@ -162,13 +2003,16 @@ def main(service, refs):
         """, unsafe_allow_html=True)
 
 
-        st.write("A Busca de Referência pode ser feita por quatro campos diferentes:")
+        st.write("A Busca de Referência pode ser feita de seis formas diferentes:")
         st.write("""
                 - Pelo Assunto Principal
                 - Pela Campanha
                 - Pelas Palavras-Chave
                 - Pelo Texto de Resumo da Referência
+                - Em todos os campos ao mesmo tempo, com os resultados mais relevantes primeiro
+                - Por referências semelhantes, comparando o texto informado com as descrições
                 """)
+        st.write("Em cada resultado, o botão \"Mais como esta\" mostra as referências com a descrição mais parecida.")
         st.header("Registro de Referências:")
         st.write("Para o registro de referência, é importante que todos os campos sejam preenchidos. Os campos da tabela são:")
         st.write("""
@@ -191,7 +2035,7 @@ def main(service, refs):
         st.write("Por qual campo você quer fazer sua busca:")
         
         # Criando colunas para os botões
-        col1, col2, col3, col4 = st.columns(4)
+        col1, col2, col3, col4, col5, col6 = st.columns(6)
 
         # Adicionando os botões em cada coluna
         with col1:
@@ -206,6 +2050,12 @@ def main(service, refs):
         with col4:
             if st.button("Texto Resumo"):
                 st.session_state.coluna_busca = "DESCRICAO"
+        with col5:
+            if st.button("Todos os Campos"):
+                st.session_state.coluna_busca = BUSCA_GERAL
+        with col6:
+            if st.button("Semelhantes"):
+                st.session_state.coluna_busca = BUSCA_SEMELHANTES
 
         # Inicializar o estado de edição se não existir
         if "editando_referencia" not in st.session_state:
@@ -215,19 +2065,28 @@ def main(service, refs):
         # Verificando se uma coluna de busca foi selecionada
         if "coluna_busca" in st.session_state:
             coluna_busca = st.session_state.coluna_busca
-            termo_busca = st.text_input(f"Digite o termo para a busca no campo {coluna_busca}: ")
+            if coluna_busca == BUSCA_GERAL:
+                termo_busca = st.text_input("Digite o termo para a busca em todos os campos: ")
+                st.caption(f"Os {TOP_K_BUSCA} resultados mais relevantes são exibidos primeiro.")
+                case_sensitive = False
+            elif coluna_busca == BUSCA_SEMELHANTES:
+                termo_busca = st.text_input("Descreva a referência que você procura: ")
+                st.caption(f"As {TOP_K_SEMELHANTES} referências com a descrição mais parecida são exibidas primeiro.")
+                case_sensitive = False
+            else:
+                termo_busca = st.text_input(f"Digite o termo para a busca no campo {coluna_busca}: ")
             
-            # Opção para busca sensível a maiúsculas/minúsculas
-            case_sensitive = st.checkbox("Busca sensível a maiúsculas/minúsculas", value=False)
+                # Opção para busca sensível a maiúsculas/minúsculas
+                case_sensitive = st.checkbox("Busca sensível a maiúsculas/minúsculas", value=False)
             
             if st.button("Buscar"):
                 if termo_busca.strip():  # Verifica se o termo de busca não está vazio
+                    # Armazenar a busca no session_state; as posições ficam no cache de buscas da sessão
+                    st.session_state.busca_atual = (coluna_busca, termo_busca, case_sensitive)
+                    st.session_state.pagina_resultados = 0  # Nova busca sempre começa na primeira página
                     resultados = buscar_termo(refs, coluna_busca, termo_busca, case_sensitive=case_sensitive)
                     
-                    # Armazenar os resultados no session_state para uso posterior
-                    st.session_state.resultados_busca = resultados
-                    
-                    if not resultados.empty:
+                    if len(resultados) > 0:
                         st.write(f"Resultados da busca por '{termo_busca}' no campo '{coluna_busca}':")
                         st.session_state.mostrando_resultados = True
                     else:
@@ -236,13 +2095,22 @@ def main(service, refs):
                 else:
                     st.warning("Por favor, insira um termo de busca.")
             
+            # Se a referência em edição foi excluída por outro usuário, sair do modo de edição
+            if st.session_state.editando_referencia and st.session_state.indice_edicao is not None:
+                if posicao_referencia(refs, st.session_state.indice_edicao) is None:
+                    st.session_state.editando_referencia = False
+                    st.session_state.indice_edicao = None
+                    st.warning("A referência em edição não existe mais.")
+
             # Se houver resultados armazenados, exibi-los
-            if "resultados_busca" in st.session_state and "mostrando_resultados" in st.session_state and st.session_state.mostrando_resultados:
+            if "busca_atual" in st.session_state and "mostrando_resultados" in st.session_state and st.session_state.mostrando_resultados:
                 # Se estiver no modo de edição, mostrar o formulário de edição
                 if st.session_state.editando_referencia and st.session_state.indice_edicao is not None:
-                    # Obter o índice real da referência no DataFrame original
-                    idx = st.session_state.indice_edicao
-                    referencia = refs.iloc[idx]
+                    # Localizar a referência pelo seu ID (índice hash, sem percorrer a tabela)
+                    id_edicao = st.session_state.indice_edicao
+                    idx = posicao_referencia(refs, id_edicao)
+                    # Campos vazios chegam como pd.NA nas colunas do Arrow; os widgets esperam texto
+                    referencia = refs.iloc[idx].astype(object).fillna("")
                     
                     st.subheader("Editar Referência")
                     
@@ -261,39 +2129,36 @@ def main(service, refs):
                     
                     with col1:
                         if st.button("Salvar Alterações"):
-                            # Verificar se todos os campos foram preenchidos
-                            if all([novo_titulo, nova_campanha, nova_categoria, novo_local, novo_assunto, novo_caminho, nova_descricao, novo_idioma, novas_palavras]):
-                                # Verificar se palavras-chave contém de 3 a 5 palavras
-                                if 3 <= len(novas_palavras.split()) <= 5:
-                                    # Atualizar os valores no DataFrame
-                                    refs.at[idx, 'TITULO'] = novo_titulo
-                                    refs.at[idx, 'CAMPANHA'] = nova_campanha
-                                    refs.at[idx, 'CATEGORIA'] = nova_categoria
-                                    refs.at[idx, 'LOCAL'] = novo_local
-                                    refs.at[idx, 'ASSUNTO_PRINCIPAL'] = novo_assunto
-                                    refs.at[idx, 'CAMINHO'] = novo_caminho
-                                    refs.at[idx, 'DESCRICAO'] = nova_descricao
-                                    refs.at[idx, 'IDIOMA'] = novo_idioma
-                                    refs.at[idx, 'PALAVRAS_CHAVES'] = novas_palavras
-                                    
-                                    # Salvar as alterações no CSV
-                                    upload_csv(service, refs)
-                                    
-                                    # Atualizar também os resultados da busca
-                                    st.session_state.resultados_busca = buscar_termo(refs, coluna_busca, termo_busca, case_sensitive=case_sensitive)
-                                    
-                                    st.success("Referência atualizada com sucesso!")
-                                    
-                                    # Sair do modo de edição
-                                    st.session_state.editando_referencia = False
-                                    st.session_state.indice_edicao = None
-                                    
-                                    # Recarregar a página para mostrar as alterações
-                                    st.rerun()
-                                else:
-                                    st.warning("O campo 'Palavras-Chave' deve conter de 3 a 5 palavras.")
+                            # Normaliza os campos e verifica preenchimento, palavras-chave e link repetido
+                            registro_editado, motivo = validar_registro(refs, {
+                                "TITULO": novo_titulo,
+                                "CAMPANHA": nova_campanha,
+                                "CATEGORIA": nova_categoria,
+                                "LOCAL": novo_local,
+                                "ASSUNTO_PRINCIPAL": novo_assunto,
+                                "CAMINHO": novo_caminho,
+                                "DESCRICAO": nova_descricao,
+                                "IDIOMA": novo_idioma,
+                                "PALAVRAS_CHAVES": novas_palavras
+                            }, ignorar=idx)
+                            if not motivo:
+                                # Atualizar o DataFrame e salvar apenas a alteração no Drive
+                                refs = salvar_alteracao(armazenamento, refs, {
+                                    "op": "editar",
+                                    "id": id_edicao,
+                                    "registro": registro_editado
+                                })
+                                
+                                st.success("Referência atualizada com sucesso!")
+                                
+                                # Sair do modo de edição
+                                st.session_state.editando_referencia = False
+                                st.session_state.indice_edicao = None
+                                
+                                # Recarregar a página para mostrar as alterações
+                                st.rerun()
                             else:
-                                st.warning("Por favor, preencha todos os campos.")
+                                st.warning(motivo)
                     
                     with col2:
                         if st.button("Cancelar Edição"):
@@ -303,34 +2168,73 @@ def main(service, refs):
                 
                 # Caso contrário, mostrar os resultados normalmente
                 else:
-                    for i, (idx, row) in enumerate(st.session_state.resultados_busca.iterrows()):
-                        with st.container():
-                            st.write(f"Resultado {i + 1}")
-                            st.write(f"**Assunto principal:** {row['ASSUNTO_PRINCIPAL']}")
-                            st.write(f"**Título:** {row['TITULO']}")
-                            st.write(f"**Campanha:** {row['CAMPANHA']}")
-                            st.write(f"**Descrição:** {row['DESCRICAO']}")
-                            st.write(f"**Palavras-Chave:** {row['PALAVRAS_CHAVES']}")
-                            st.link_button("**Link para referência**", url=row['CAMINHO'])
+                    # Apenas a página atual é renderizada, independentemente do total de resultados
+                    # (as posições vêm do cache da sessão e são recalculadas se o CSV mudar)
+                    resultados = buscar_termo(refs, *st.session_state.busca_atual)
+                    total_paginas = max(1, -(-len(resultados) // RESULTADOS_POR_PAGINA))
+                    pagina = min(st.session_state.get("pagina_resultados", 0), total_paginas - 1)
+                    st.session_state.pagina_resultados = pagina
+                    inicio = pagina * RESULTADOS_POR_PAGINA
+                    if st.session_state.busca_atual[0] == SEMELHANTES_A:
+                        posicao_origem = posicao_referencia(refs, st.session_state.busca_atual[1])
+                        if posicao_origem is not None:
+                            st.write(f"Referências semelhantes a '{refs.iloc[posicao_origem]['TITULO']}':")
+                    st.caption(f"{len(resultados)} resultado(s) — página {pagina + 1} de {total_paginas}")
+
+                    with medir_etapa("renderizacao") as medida:
+                        pagina_refs = refs.iloc[resultados[inicio:inicio + RESULTADOS_POR_PAGINA]]
+                        medida["linhas"] = len(pagina_refs)
+                        for i, (idx, row) in enumerate(pagina_refs.astype(object).fillna("").iterrows(), start=inicio):
+                            with st.container():
+                                st.write(f"Resultado {i + 1}")
+                                st.write(f"**Assunto principal:** {row['ASSUNTO_PRINCIPAL']}")
+                                st.write(f"**Título:** {row['TITULO']}")
+                                st.write(f"**Campanha:** {row['CAMPANHA']}")
+                                st.write(f"**Descrição:** {row['DESCRICAO']}")
+                                st.write(f"**Palavras-Chave:** {row['PALAVRAS_CHAVES']}")
+                                st.link_button("**Link para referência**", url=row['CAMINHO'], disabled=not row['CAMINHO'])
                             
-                            # Botões de editar e excluir lado a lado
-                            col1, col2 = st.columns(2)
-                            with col1:
-                                # O botão de editar configura o modo de edição e armazena o índice
-                                if st.button(f"Editar", key=f"edit_{i}"):
-                                    st.session_state.editando_referencia = True
-                                    st.session_state.indice_edicao = idx  # Armazena o índice real no DataFrame
-                                    st.rerun()  # Recarrega a página para mostrar o formulário de edição
+                                # Botões de editar, excluir e buscar semelhantes lado a lado
+                                col1, col2, col3 = st.columns(3)
+                                with col1:
+                                    # O botão de editar configura o modo de edição e armazena o índice
+                                    if st.button(f"Editar", key=f"edit_{i}"):
+                                        st.session_state.editando_referencia = True
+                                        st.session_state.indice_edicao = row[COLUNA_ID]  # Armazena o ID da referência
+                                        st.rerun()  # Recarrega a página para mostrar o formulário de edição
                             
-                            with col2:
-                                # O botão de excluir mostra uma confirmação
-                                if st.button(f"Excluir", key=f"delete_{i}"):
-                                    # Configura o estado para mostrar a confirmação
-                                    st.session_state.confirmando_exclusao = True
-                                    st.session_state.indice_exclusao = idx
-                                    st.rerun()
+                                with col2:
+                                    # O botão de excluir mostra uma confirmação
+                                    if st.button(f"Excluir", key=f"delete_{i}"):
+                                        # Configura o estado para mostrar a confirmação
+                                        st.session_state.confirmando_exclusao = True
+                                        st.session_state.indice_exclusao = row[COLUNA_ID]
+                                        st.rerun()
+
+                                with col3:
+                                    # Mostra as referências com a descrição mais parecida com esta
+                                    if st.button("Mais como esta", key=f"similar_{i}"):
+                                        st.session_state.coluna_busca = BUSCA_SEMELHANTES
+                                        st.session_state.busca_atual = (SEMELHANTES_A, row[COLUNA_ID], False)
+                                        st.session_state.pagina_resultados = 0
+                                        st.session_state.mostrando_resultados = True
+                                        st.rerun()
                             
-                            st.write("---")
+                                st.write("---")
+
+                    # Navegação entre as páginas de resultados
+                    if total_paginas > 1:
+                        col1, col2, col3 = st.columns([1, 2, 1])
+                        with col1:
+                            if st.button("← Anterior", disabled=pagina == 0):
+                                st.session_state.pagina_resultados = pagina - 1
+                                st.rerun()
+                        with col2:
+                            st.write(f"Página {pagina + 1} de {total_paginas}")
+                        with col3:
+                            if st.button("Próxima →", disabled=pagina >= total_paginas - 1):
+                                st.session_state.pagina_resultados = pagina + 1
+                                st.rerun()
                     
                     # Exibir a caixa de confirmação se estiver confirmando exclusão
                     if "confirmando_exclusao" in st.session_state and st.session_state.confirmando_exclusao:
@@ -339,20 +2243,14 @@ def main(service, refs):
                         
                         with col1:
                             if st.button("Sim, excluir"):
-                                # Obter o índice da referência a excluir
-                                idx_excluir = st.session_state.indice_exclusao
-                                
-                                # Excluir a referência do DataFrame
-                                refs = refs.drop(idx_excluir).reset_index(drop=True)
+                                # Obter o ID da referência a excluir
+                                id_excluir = st.session_state.indice_exclusao
                                 
-                                # Salvar o DataFrame atualizado
-                                upload_csv(service, refs)
-                                
-                                # Atualizar os resultados da busca
-                                st.session_state.resultados_busca = buscar_termo(refs, coluna_busca, termo_busca, case_sensitive=case_sensitive)
+                                # Excluir a referência do DataFrame e salvar apenas a exclusão no Drive
+                                refs = salvar_alteracao(armazenamento, refs, {"op": "excluir", "id": id_excluir})
                                 
                                 # Se não houver mais resultados, atualizar o estado
-                                if st.session_state.resultados_busca.empty:
+                                if len(buscar_termo(refs, *st.session_state.busca_atual)) == 0:
                                     st.session_state.mostrando_resultados = False
                                 
                                 # Limpar o estado de confirmação
@@ -396,40 +2294,70 @@ def main(service, refs):
             submitted = st.form_submit_button("Registrar Referência")
             
             if submitted:
-                # Verifica se todos os campos foram preenchidos
-                if all([titulo, campanha, categoria, local, assunto_principal, caminho, resumo, idioma, palavras_chave]):
-                    # Verifica se o campo "Palavras-Chave" contém de 3 a 5 palavras
-                    if 3 <= len(palavras_chave.split()) <= 5:
-                        # Cria um novo registro
-                        novo_registro = {
-                            "TITULO": titulo,
-                            "CAMPANHA": campanha,
-                            "CATEGORIA": categoria,
-                            "LOCAL": local,
-                            "ASSUNTO_PRINCIPAL": assunto_principal,
-                            "CAMINHO": caminho,
-                            "DESCRICAO": resumo,
-                            "IDIOMA": idioma,
-                            "PALAVRAS_CHAVES": palavras_chave
-                        }
-                        
-                        # Adiciona o novo registro ao DataFrame
-                        refs = pd.concat([refs, pd.DataFrame([novo_registro])], ignore_index=True)
-                        
-                        # Salva o DataFrame atualizado no arquivo CSV
-                        upload_csv(service, refs)
-                        
-                        st.success("Referência registrada com sucesso!")
-                        st.write("Dados registrados:")
-                        st.write(novo_registro)
-                        
-                        # Incrementar o contador para criar um novo formulário com campos vazios
+                # Normaliza os campos e verifica preenchimento, palavras-chave e link já cadastrado
+                novo_registro, motivo = validar_registro(refs, {
+                    "TITULO": titulo,
+                    "CAMPANHA": campanha,
+                    "CATEGORIA": categoria,
+                    "LOCAL": local,
+                    "ASSUNTO_PRINCIPAL": assunto_principal,
+                    "CAMINHO": caminho,
+                    "DESCRICAO": resumo,
+                    "IDIOMA": idioma,
+                    "PALAVRAS_CHAVES": palavras_chave
+                })
+                if not motivo:
+                    # Cria um novo registro
+                    novo_registro = {COLUNA_ID: uuid.uuid4().hex, **novo_registro}
+                    
+                    # Adiciona o novo registro ao DataFrame e salva apenas ele no Drive
+                    refs = salvar_alteracao(armazenamento, refs, {"op": "adicionar", "registro": novo_registro})
+                    
+                    st.success("Referência registrada com sucesso!")
+                    st.write("Dados registrados:")
+                    st.write(novo_registro)
+                    
+                    # Incrementar o contador para criar um novo formulário com campos vazios
+                    st.session_state.form_counter += 1
+                    st.rerun()
+                else:
+                    st.warning(motivo)
+
+        # Importação em lote: valida todas as linhas de uma vez e grava as válidas numa única alteração
+        st.subheader("Importação em lote")
+        if "importacao_concluida" in st.session_state:
+            st.success(f"{st.session_state.pop('importacao_concluida')} referência(s) importada(s) com sucesso!")
+        st.write(
+            "Envie um arquivo CSV ou XLSX, ou cole as linhas de uma planilha, com as colunas "
+            + ", ".join(COLUNAS_REFS) + ". Sem cabeçalho, as colunas devem seguir essa ordem."
+        )
+        arquivo = st.file_uploader("Arquivo de referências:", type=["csv", "xlsx"], key=f"importacao_arquivo_{form_key}")
+        texto = st.text_area("Ou cole as linhas aqui:", key=f"importacao_texto_{form_key}")
+        if arquivo is not None or texto.strip():
+            try:
+                registros = ler_importacao(arquivo, texto)
+            except Exception as e:
+                st.error(f"Não foi possível ler as referências importadas: {e}")
+                registros = None
+            if registros is not None:
+                validos, rejeitados = preparar_importacao(refs, registros)
+                st.write(f"{len(validos)} referência(s) prontas para registro, {len(rejeitados)} rejeitada(s).")
+                if len(rejeitados):
+                    st.dataframe(rejeitados, hide_index=True, use_container_width=True)
+                if len(validos) and st.button(f"Importar {len(validos)} referência(s)"):
+                    novos_registros = validos.assign(**{COLUNA_ID: [uuid.uuid4().hex for _ in range(len(validos))]})
+                    alteracoes = [{"op": "adicionar", "registro": registro} for registro in novos_registros.to_dict("records")]
+                    refs = salvar_alteracao(armazenamento, refs, {"op": "lote", "alteracoes": alteracoes})
+                    # Em caso de erro, a mensagem de salvar_alteracao continua na tela
+                    if posicao_referencia(refs, alteracoes[-1]["registro"][COLUNA_ID]) is not None:
+                        st.session_state.importacao_concluida = len(alteracoes)
                         st.session_state.form_counter += 1
                         st.rerun()
-                    else:
-                        st.warning("O campo 'Palavras-Chave' deve conter de 3 a 5 palavras.")
-                else:
-                    st.warning("Por favor, preencha todos os campos.")
+
+    if admin:
+        with tab_desempenho[0]:
+            exibir_painel_desempenho()
+            refs = exibir_manutencao(armazenamento, refs)
 
 
 if __name__ == "__main__":
@@ -437,13 +2365,17 @@ if __name__ == "__main__":
     if "usuario_autenticado" not in st.session_state:
         st.session_state.usuario_autenticado = False
 
+    # Começa a carregar as referências em segundo plano enquanto o login é exibido
+    _carregador_refs()
+
     # Se o usuário não estiver autenticado, exibe os campos de usuário e senha
     if not st.session_state.usuario_autenticado:
         verificar_usuario_senha()
     else:
         # Se o usuário já estiver autenticado, exibe o aplicativo diretamente
-        service = authenticate_google_drive()
-        if service is not None:  # Verifica se a autenticação foi bem-sucedida
-            refs = download_csv(service)
-            if refs is not None:  # Verifica se o download do CSV foi bem-sucedido
-                main(service, refs)
+        with medir_execucao():
+            armazenamento = obter_armazenamento()
+            if armazenamento is not None:  # Verifica se a autenticação foi bem-sucedida
+                refs = carregar_refs(armazenamento)
+                if refs is not None:  # Verifica se o carregamento foi bem-sucedido
+                    main(armazenamento, refs)
@@ -0,0 +1,477 @@
+"""
+Benchmark dos caminhos de carga, busca, renderização e gravação da tabela de referências.
+
+Gera tabelas sintéticas (refs.csv) com distribuições parecidas com as reais, guarda-as em
+um Google Drive simulado em memória e mede cada caminho do app: carga (fria e quente),
+construção do índice, buscas, renderização dos resultados pelo AppTest do Streamlit e
+gravações (delta e tabela completa). Para cada cenário são informados p50/p95 da latência,
+o pico de memória alocada e os bytes transferidos com o Drive. As tabelas são geradas em
+blocos e, acima de LIMITE_MEMORIA linhas, o pico de memória não é medido: o tracemalloc
+registra cada alocação e, com 1 milhão de linhas, esgotaria a memória da máquina. Mesmo
+assim, a tabela de 1 milhão de linhas fica fora dos tamanhos padrão (veja --grande).
+
+Uso:
+    python benchmark.py                          # compara com a baseline salva
+    python benchmark.py --linhas 1000 100000     # apenas alguns tamanhos
+    python benchmark.py --grande                 # inclui a tabela de 1 milhão de linhas
+    python benchmark.py --salvar-baseline        # grava os resultados como nova baseline
+    python benchmark.py --salvar-baseline --apenas-novos  # grava só os cenários ainda sem baseline
+
+O processo termina com código 1 se algum cenário ficar mais lento (ou usar mais memória)
+que a baseline além da tolerância (diferenças menores que 1 ms e 0,1 MB são ignoradas).
+Nos cenários "app_*", o pico de memória inclui a compilação do app.py, que o AppTest refaz a
+cada execução: ele cresce com o tamanho do arquivo.
+"""
+import os
+import re
+import sys
+import json
+import time
+import hashlib
+import logging
+import argparse
+import itertools
+import platform
+import threading
+import traceback
+import tracemalloc
+import warnings
+from collections import Counter
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+import app
+
+TAMANHOS = [1_000, 100_000]  # Quantidades de linhas das tabelas sintéticas
+TAMANHO_GRANDE = 1_000_000  # Tabela medida apenas com --grande (o processo chega a uns 5,6 GB de memória)
+REPETICOES = 7  # Execuções medidas de cada cenário
+LINHAS_POR_BLOCO = 100_000  # Linhas sintéticas geradas (e convertidas para CSV) por vez
+LIMITE_MEMORIA = 100_000  # Acima dessa quantidade de linhas o pico de memória não é medido (o tracemalloc multiplica o uso de memória)
+TOLERANCIA = 0.2  # Piora relativa aceita em relação à baseline (20%)
+DIFERENCA_MINIMA = {"p50_ms": 1.0, "pico_memoria_mb": 0.1}  # Abaixo dessas diferenças absolutas, a variação é ruído de medição
+ARQUIVO_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+
+# Vocabulário usado nas tabelas sintéticas
+PALAVRAS_COMUNS = (
+    "corrida estilo juventude música moda esporte saúde tecnologia viagem comida arte cinema "
+    "futebol praia cidade natureza família educação carreira inovação sustentável marca campanha "
+    "lançamento tendência verão inverno festival show jovem atleta treino maratona conforto "
+    "performance lifestyle digital conexão internet celular plano cerveja amigos beleza perfume"
+).split()
+CAMPANHAS = ["Netshoes", "Claro", "Nike", "Adidas", "Natura", "Itaú", "Ambev", "Vivo", "Magalu", "Boticário"]
+CATEGORIAS = {"POST": 0.45, "REPORTAGEM": 0.2, "TEXTO": 0.15, "VÍDEO": 0.15, "PODCAST": 0.05}
+LOCAIS = {"INSTAGRAM": 0.4, "TIKTOK": 0.2, "FACEBOOK": 0.1, "YOUTUBE": 0.1, "www.meioemensagem.com.br": 0.1, "www.g1.globo.com": 0.1}
+IDIOMAS = {"PORTUGUÊS": 0.8, "INGLÊS": 0.15, "ESPANHOL": 0.05}
+
+# Gera uma tabela sintética de referências. As palavras seguem uma distribuição de Zipf
+# (poucas muito frequentes, muitas raras) e os campos categóricos têm pesos desiguais.
+# "inicio" é o número da primeira referência (usado nos links).
+def gerar_corpus(linhas, semente=0, inicio=0):
+    rng = np.random.default_rng(semente)
+    letras = np.array(list("abcdefghijklmnopqrstuvwxyzçãéíóú"))
+    raras = ["".join(rng.choice(letras, rng.integers(4, 11))) for _ in range(20_000)]
+    vocabulario = np.array(PALAVRAS_COMUNS + raras, dtype=object)
+    pesos = 1 / np.arange(1, len(vocabulario) + 1) ** 1.1
+    pesos /= pesos.sum()
+
+    # Sorteia todas as palavras de uma vez e as divide entre as linhas
+    def textos(minimo, maximo):
+        tamanhos = rng.integers(minimo, maximo + 1, linhas)
+        palavras = vocabulario[rng.choice(len(vocabulario), tamanhos.sum(), p=pesos)]
+        fins = np.cumsum(tamanhos)
+        return [" ".join(palavras[fim - tamanho:fim]) for fim, tamanho in zip(fins, tamanhos)]
+
+    def sortear(opcoes):
+        return rng.choice(list(opcoes), linhas, p=list(opcoes.values()))
+
+    pesos_campanhas = 1 / np.arange(1, len(CAMPANHAS) + 1)
+    temas = np.array(PALAVRAS_COMUNS)
+    chaves = rng.choice(len(temas), (linhas, 5))
+    quantidade_chaves = rng.integers(3, 6, linhas)
+    return pd.DataFrame({
+        "TITULO": [titulo.title() for titulo in textos(3, 8)],
+        "CAMPANHA": rng.choice(CAMPANHAS, linhas, p=pesos_campanhas / pesos_campanhas.sum()),
+        "CATEGORIA": sortear(CATEGORIAS),
+        "LOCAL": sortear(LOCAIS),
+        "ASSUNTO_PRINCIPAL": np.char.upper(temas[rng.integers(0, len(temas), linhas)]),
+        "CAMINHO": [f"https://www.exemplo{i % 97}.com.br/referencia/{i}" for i in range(inicio, inicio + linhas)],
+        "DESCRICAO": [descricao.capitalize() + "." for descricao in textos(15, 40)],
+        "IDIOMA": sortear(IDIOMAS),
+        "PALAVRAS_CHAVES": [", ".join(temas[linha[:n]]) for linha, n in zip(chaves, quantidade_chaves)],
+    })
+
+# Gera o refs.csv sintético em blocos de LINHAS_POR_BLOCO linhas (cada um com a sua semente),
+# sem montar a tabela inteira nem o texto completo do CSV de uma vez. Até LINHAS_POR_BLOCO
+# linhas, é o CSV de gerar_corpus(linhas).
+def gerar_csv(linhas, semente=0):
+    blocos = []
+    for bloco, inicio in enumerate(range(0, linhas, LINHAS_POR_BLOCO)):
+        corpus = gerar_corpus(min(LINHAS_POR_BLOCO, linhas - inicio), semente + bloco, inicio)
+        blocos.append(corpus.to_csv(index=False, header=not bloco).encode())
+        del corpus
+    return b"".join(blocos)
+
+# Google Drive simulado em memória. Implementa as chamadas usadas por ArmazenamentoDrive,
+# inclusive o download em partes do MediaIoBaseDownload, e conta os bytes transferidos.
+class DriveLocal:
+    def __init__(self):
+        self.arquivos = {}
+        self.contador = itertools.count(1)
+        self.chamadas = Counter()
+        self.bytes_baixados = 0
+        self.bytes_enviados = 0
+
+    def files(self):
+        return _ArquivosDrive(self)
+
+    # Coloca um arquivo na pasta, como se tivesse sido enviado por fora do app
+    def incluir(self, nome, conteudo, app_properties=None):
+        file_id = f"arquivo{next(self.contador)}"
+        self.arquivos[file_id] = {
+            "name": nome, "data": conteudo, "md5": hashlib.md5(conteudo).hexdigest(),
+            "rev": next(self.contador), "app": dict(app_properties or {}),
+        }
+        return file_id
+
+class _RequisicaoDrive:
+    def __init__(self, executar, http=None):
+        self.executar = executar
+        self.http = http
+        self.uri = "drive-local://arquivo"
+        self.headers = {}
+
+    def execute(self, **kwargs):
+        return self.executar()
+
+# Resposta HTTP mínima esperada pelo MediaIoBaseDownload
+class _RespostaHttp(dict):
+    def __init__(self, status, cabecalhos):
+        super().__init__(cabecalhos)
+        self.status = status
+
+class _HttpDrive:
+    def __init__(self, drive, file_id):
+        self.drive = drive
+        self.file_id = file_id
+
+    def request(self, uri, method="GET", headers=None, **kwargs):
+        dados = self.drive.arquivos[self.file_id]["data"]
+        intervalo = re.match(r"bytes=(\d+)-(\d+)", (headers or {}).get("range", ""))
+        inicio, fim = (int(intervalo.group(1)), int(intervalo.group(2))) if intervalo else (0, len(dados) - 1)
+        parte = dados[inicio:fim + 1]
+        self.drive.bytes_baixados += len(parte)
+        return _RespostaHttp(206, {"content-range": f"bytes {inicio}-{inicio + len(parte) - 1}/{len(dados)}"}), parte
+
+class _ArquivosDrive:
+    def __init__(self, drive):
+        self.drive = drive
+
+    def _metadados(self, file_id):
+        arquivo = self.drive.arquivos[file_id]
+        return {
+            "id": file_id, "name": arquivo["name"], "md5Checksum": arquivo["md5"],
+            "headRevisionId": str(arquivo["rev"]), "appProperties": dict(arquivo["app"]),
+        }
+
+    def _registrar(self, chamada, executar, http=None):
+        def executar_contando():
+            self.drive.chamadas[chamada] += 1
+            return executar()
+        return _RequisicaoDrive(executar_contando, http)
+
+    def list(self, q="", **kwargs):
+        # Entende apenas as condições de nome usadas pelo app, unidas por "or"
+        condicoes = re.findall(r"name (=|contains) '([^']*)'", q)
+        def listar():
+            return {"files": [
+                self._metadados(file_id) for file_id, arquivo in self.drive.arquivos.items()
+                if any(arquivo["name"] == nome if operador == "=" else nome in arquivo["name"] for operador, nome in condicoes)
+            ]}
+        return self._registrar("list", listar)
+
+    def get(self, fileId, **kwargs):
+        return self._registrar("get", lambda: self._metadados(fileId))
+
+    def get_media(self, fileId, **kwargs):
+        def baixar():
+            dados = self.drive.arquivos[fileId]["data"]
+            self.drive.bytes_baixados += len(dados)
+            return dados
+        return self._registrar("get_media", baixar, http=_HttpDrive(self.drive, fileId))
+
+    def _gravar(self, file_id, media_body, app_properties):
+        dados = media_body.getbytes(0, media_body.size())
+        self.drive.bytes_enviados += len(dados)
+        arquivo = self.drive.arquivos[file_id]
+        arquivo["data"] = dados
+        arquivo["md5"] = hashlib.md5(dados).hexdigest()
+        arquivo["rev"] = next(self.drive.contador)
+        # Como no Drive, as propriedades são mescladas às existentes e None remove a propriedade
+        arquivo["app"].update(app_properties or {})
+        arquivo["app"] = {chave: valor for chave, valor in arquivo["app"].items() if valor is not None}
+        return self._metadados(file_id)
+
+    def create(self, body=None, media_body=None, **kwargs):
+        def criar():
+            file_id = self.drive.incluir(body["name"], b"")
+            return self._gravar(file_id, media_body, body.get("appProperties"))
+        return self._registrar("create", criar)
+
+    def update(self, fileId, body=None, media_body=None, **kwargs):
+        return self._registrar("update", lambda: self._gravar(fileId, media_body, (body or {}).get("appProperties")))
+
+    def delete(self, fileId, **kwargs):
+        return self._registrar("delete", lambda: self.drive.arquivos.pop(fileId, None))
+
+# Mede um cenário: latências das repetições e, numa execução à parte (o tracemalloc
+# deixa tudo mais lento), o pico de memória alocada, se "memoria" for verdadeiro.
+# "preparar" roda antes de cada execução, fora da medição.
+def medir(drive, executar, repeticoes, preparar=None, memoria=True):
+    latencias = []
+    bytes_baixados, bytes_enviados = drive.bytes_baixados, drive.bytes_enviados
+    for _ in range(repeticoes):
+        if preparar:
+            preparar()
+        inicio = time.perf_counter()
+        executar()
+        latencias.append(time.perf_counter() - inicio)
+    baixados = (drive.bytes_baixados - bytes_baixados) / repeticoes
+    enviados = (drive.bytes_enviados - bytes_enviados) / repeticoes
+
+    pico = None
+    if memoria:
+        if preparar:
+            preparar()
+        tracemalloc.start()
+        executar()
+        pico = round(tracemalloc.get_traced_memory()[1] / 2**20, 2)
+        tracemalloc.stop()
+
+    latencias = np.array(latencias) * 1000
+    return {
+        "p50_ms": round(float(np.percentile(latencias, 50)), 3),
+        "p95_ms": round(float(np.percentile(latencias, 95)), 3),
+        "pico_memoria_mb": pico,
+        "bytes_baixados": int(baixados),
+        "bytes_enviados": int(enviados),
+    }
+
+# Cenários executados diretamente sobre as funções do app
+def medir_funcoes(drive, repeticoes, memoria=True):
+    armazenamento = app.ArmazenamentoDrive(drive)
+    resultados = {}
+
+    def medir_cenario(executar, repeticoes, preparar=None):
+        return medir(drive, executar, repeticoes, preparar, memoria)
+
+    def carga_fria():
+        app._invalidar_cache_refs()
+        app._indice_busca.clear()
+        app._cache_refs()["indices"].clear()
+    resultados["carga_fria"] = medir_cenario(armazenamento.atualizar_cache, repeticoes, preparar=carga_fria)
+    resultados["carga_quente"] = medir_cenario(armazenamento.atualizar_cache, repeticoes)
+    # Carga com a busca da sessão aberta: o índice da coluna é montado durante o download
+    resultados["carga_fria_indexada"] = medir_cenario(
+        lambda: armazenamento.atualizar_cache(indexar=["DESCRICAO"]), repeticoes, preparar=carga_fria
+    )
+
+    def indice_frio():
+        app._indice_busca.clear()
+        app._cache_refs()["indices"].clear()
+    refs = armazenamento.atualizar_cache()
+    resultados["indice_busca"] = medir_cenario(
+        lambda: app.buscar_posicoes(refs, "DESCRICAO", "praia"), repeticoes, preparar=indice_frio
+    )
+    for coluna in ["ASSUNTO_PRINCIPAL", "CAMPANHA", "PALAVRAS_CHAVES", "DESCRICAO"]:
+        app.buscar_posicoes(refs, coluna, "a")  # Índice já construído: mede apenas a consulta
+    resultados["busca_palavra"] = medir_cenario(lambda: app.buscar_posicoes(refs, "DESCRICAO", "praia"), repeticoes)
+    resultados["busca_trecho"] = medir_cenario(lambda: app.buscar_posicoes(refs, "DESCRICAO", "ção de"), repeticoes)
+    resultados["busca_sensivel"] = medir_cenario(
+        lambda: app.buscar_posicoes(refs, "CAMPANHA", "Nike", case_sensitive=True), repeticoes
+    )
+    app.buscar_ranqueado(refs, "a")
+    resultados["busca_ranqueada"] = medir_cenario(lambda: app.buscar_ranqueado(refs, "moda verão praia"), repeticoes)
+    # Semelhança: a matriz TF-IDF é montada uma vez por revisão, sobre o índice já construído
+    resultados["matriz_semelhanca"] = medir_cenario(
+        lambda: app._matriz_semelhanca(refs, app.revisao_tabela(refs), len(refs)), repeticoes,
+        preparar=app._matriz_semelhanca.clear,
+    )
+    resultados["busca_semelhantes"] = medir_cenario(lambda: app.semelhantes_a(refs, refs.at[0, app.COLUNA_ID]), repeticoes)
+
+    # Gravação de uma alteração (delta) e da tabela completa
+    ids = iter(refs[app.COLUNA_ID].tolist())
+    resultados["gravacao_delta"] = medir_cenario(lambda: app.salvar_alteracao(
+        armazenamento, refs, {"op": "editar", "id": next(ids), "registro": {"TITULO": "Título editado"}}
+    ), min(repeticoes, app.LIMITE_DELTAS - 1))
+    armazenamento.compactar()  # Incorpora os deltas acima antes de medir a gravação completa
+    resultados["gravacao_completa"] = medir_cenario(
+        lambda: armazenamento.enviar_tabela(app._cache_refs()["df"].copy()), repeticoes
+    )
+    return resultados
+
+# Cenários executados pelo AppTest: a execução completa do app e a renderização dos resultados
+# Aguarda as threads de carregamento do app (as do AppTest são de outra cópia do módulo,
+# por isso são identificadas pelo nome e pelo arquivo que estão executando)
+def aguardar_carregamento(limite=600):
+    prazo = time.monotonic() + limite
+    arquivo = os.path.abspath(app.__file__)
+    while time.monotonic() < prazo:
+        nomes = {thread.ident: thread.name for thread in threading.enumerate()}
+        ocupadas = [
+            ident for ident, quadro in sys._current_frames().items()
+            if nomes.get(ident, "").startswith("carregar-refs") and any(
+                os.path.abspath(item.filename) == arquivo for item in traceback.extract_stack(quadro)
+            )
+        ]
+        if not ocupadas:
+            return
+        time.sleep(0.05)
+
+def medir_interface(drive, repeticoes, memoria=True):
+    from streamlit.testing.v1 import AppTest
+
+    def medir_cenario(executar, repeticoes, preparar=None):
+        return medir(drive, executar, repeticoes, preparar, memoria)
+    import googleapiclient.discovery
+    from google.oauth2 import service_account
+
+    # O app obtém o cliente pelo googleapiclient; aqui ele recebe o Drive simulado
+    build, credenciais = googleapiclient.discovery.build, service_account.Credentials.from_service_account_info
+    googleapiclient.discovery.build = lambda *args, **kwargs: drive
+    service_account.Credentials.from_service_account_info = classmethod(lambda cls, *args, **kwargs: None)
+    variaveis = {nome: os.environ.get(nome) for nome in ("GOOGLE_CREDENTIALS", "REFS_ARMAZENAMENTO")}
+    os.environ.update(GOOGLE_CREDENTIALS="{}", REFS_ARMAZENAMENTO="drive")
+    try:
+        teste = AppTest.from_file(os.path.abspath(app.__file__), default_timeout=600)
+        teste.session_state["usuario_autenticado"] = True
+        # Os recursos em cache (inclusive o cliente do Drive) são do processo: a primeira
+        # execução começa sem eles, como num servidor recém-iniciado
+        st.cache_resource.clear()
+        resultados = {"app_primeira_execucao": medir_cenario(teste.run, 1)}
+        # As demais medidas são do app já aquecido, sem o carregamento em segundo plano concorrendo
+        aguardar_carregamento()
+
+        def botao(rotulo):
+            return next(b for b in teste.button if b.label == rotulo)
+
+        def buscar():
+            botao("Texto Resumo").click().run()
+            teste.text_input[0].input("praia").run()
+        # A primeira busca inclui a construção do índice da coluna; as seguintes, apenas a consulta
+        resultados["app_primeira_busca"] = medir_cenario(lambda: botao("Buscar").click().run(), 1, preparar=buscar)
+        resultados["app_busca"] = medir_cenario(lambda: botao("Buscar").click().run(), repeticoes, preparar=buscar)
+        resultados["app_proxima_pagina"] = medir_cenario(lambda: botao("Próxima →").click().run(), repeticoes)
+        if teste.exception:
+            raise RuntimeError(teste.exception[0].value)
+        return resultados
+    finally:
+        googleapiclient.discovery.build = build
+        service_account.Credentials.from_service_account_info = credenciais
+        for nome, valor in variaveis.items():
+            if valor is None:
+                os.environ.pop(nome, None)
+            else:
+                os.environ[nome] = valor
+
+def executar_benchmark(tamanhos, repeticoes):
+    resultados = {}
+    for linhas in tamanhos:
+        print(f"Gerando tabela sintética com {linhas} linhas...", flush=True)
+        drive = DriveLocal()
+        drive.incluir(app.FILE_NAME, gerar_csv(linhas))
+        app._invalidar_cache_refs()
+        app._cache_refs()["ids"] = {}
+        memoria = linhas <= LIMITE_MEMORIA
+        resultados[str(linhas)] = medir_funcoes(drive, repeticoes, memoria)
+        resultados[str(linhas)].update(medir_interface(drive, repeticoes, memoria))
+        exibir(linhas, resultados[str(linhas)])
+    return resultados
+
+def exibir(linhas, resultados, baseline=None):
+    print(f"\n{linhas} linhas")
+    print(f"{'cenário':<24}{'p50 (ms)':>12}{'p95 (ms)':>12}{'memória (MB)':>14}{'baixados':>14}{'enviados':>14}")
+    for cenario, medida in resultados.items():
+        memoria = "-" if medida["pico_memoria_mb"] is None else f"{medida['pico_memoria_mb']:.1f}"
+        linha = (
+            f"{cenario:<24}{medida['p50_ms']:>12.1f}{medida['p95_ms']:>12.1f}{memoria:>14}"
+            f"{medida['bytes_baixados']:>14}{medida['bytes_enviados']:>14}"
+        )
+        anterior = (baseline or {}).get(cenario)
+        if anterior and anterior["p50_ms"]:
+            linha += f"   {medida['p50_ms'] / anterior['p50_ms']:.2f}x baseline"
+        print(linha)
+
+# Cenários que pioraram além da tolerância em latência (p50) ou memória. Diferenças abaixo de
+# DIFERENCA_MINIMA não contam, mesmo que sejam grandes em termos relativos (0,04 -> 0,16 ms).
+def comparar(resultados, baseline, tolerancia):
+    regressoes = []
+    for linhas, cenarios in resultados.items():
+        for cenario, medida in cenarios.items():
+            anterior = baseline.get(linhas, {}).get(cenario)
+            if not anterior:
+                continue
+            for metrica, minima in DIFERENCA_MINIMA.items():
+                if anterior[metrica] is None or medida[metrica] is None:
+                    continue
+                if medida[metrica] > anterior[metrica] * (1 + tolerancia) and medida[metrica] - anterior[metrica] >= minima:
+                    regressoes.append(f"{linhas} linhas / {cenario}: {metrica} {anterior[metrica]} -> {medida[metrica]}")
+    return regressoes
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark dos caminhos de carga, busca, renderização e gravação.")
+    parser.add_argument("--linhas", type=int, nargs="+", default=TAMANHOS, help="Tamanhos das tabelas sintéticas")
+    parser.add_argument("--grande", action="store_true", help=f"Inclui a tabela de {TAMANHO_GRANDE} linhas")
+    parser.add_argument("--repeticoes", type=int, default=REPETICOES, help="Execuções medidas por cenário")
+    parser.add_argument("--tolerancia", type=float, default=TOLERANCIA, help="Piora relativa aceita (0.2 = 20%%)")
+    parser.add_argument("--baseline", default=ARQUIVO_BASELINE, help="Arquivo JSON da baseline")
+    parser.add_argument("--salvar-baseline", action="store_true", help="Grava os resultados como nova baseline")
+    parser.add_argument(
+        "--apenas-novos", action="store_true", help="Com --salvar-baseline, grava só os cenários que ainda não estão na baseline"
+    )
+    args = parser.parse_args()
+
+    # Fora do "streamlit run", o Streamlit avisa a cada chamada que não há sessão
+    warnings.filterwarnings("ignore")
+    for nome in list(logging.root.manager.loggerDict):
+        if nome.startswith("streamlit"):
+            logging.getLogger(nome).setLevel(logging.ERROR)
+
+    tamanhos = args.linhas + [TAMANHO_GRANDE] if args.grande and TAMANHO_GRANDE not in args.linhas else args.linhas
+    resultados = executar_benchmark(tamanhos, args.repeticoes)
+
+    if args.salvar_baseline:
+        # Os tamanhos medidos substituem os da baseline anterior; os demais são mantidos
+        anteriores = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, encoding="utf-8") as arquivo:
+                anteriores = json.load(arquivo)["resultados"]
+        if args.apenas_novos:
+            # Os cenários já registrados mantêm a medida anterior
+            resultados = {linhas: dict(cenarios, **anteriores.get(linhas, {})) for linhas, cenarios in resultados.items()}
+        with open(args.baseline, "w", encoding="utf-8") as arquivo:
+            json.dump({
+                "ambiente": {"python": platform.python_version(), "pandas": pd.__version__, "maquina": platform.machine()},
+                "resultados": dict(anteriores, **resultados),
+            }, arquivo, indent=2, ensure_ascii=False)
+        print(f"\nBaseline salva em {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("\nNenhuma baseline encontrada; use --salvar-baseline para criar uma.")
+        return 0
+    with open(args.baseline, encoding="utf-8") as arquivo:
+        baseline = json.load(arquivo)["resultados"]
+    print("\nComparação com a baseline")
+    for linhas, cenarios in resultados.items():
+        exibir(linhas, cenarios, baseline.get(linhas))
+    regressoes = comparar(resultados, baseline, args.tolerancia)
+    if regressoes:
+        print("\nRegressões acima da tolerância:")
+        print("\n".join(f"  {regressao}" for regressao in regressoes))
+        return 1
+    print("\nNenhuma regressão acima da tolerância.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())